@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" fan-out benchmark against a fleet of in-process loopback ssh servers
+
+    python benchmarks/fleet_bench.py --nodes 300 --output-bytes 65536 --json run.json
+    python benchmarks/fleet_bench.py --nodes 300 --output-bytes 65536 --compare run.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import resource
+import sys
+import time
+from typing import Dict, List, Optional
+import asyncssh
+from picsh.command_engine import CommandEngine
+from picsh.fanout_window import DEFAULT_FANOUT
+from picsh.node import Node
+from picsh.node_metrics import percentile
+from picsh.node_table import NodeTable
+from picsh.output_buffer import BufferBudget, OutputBuffer
+
+# the done marker echo that SSHTargetNode.run_cmd sends after each command
+_ECHO_RE = re.compile(r'echo "(.*):\$\?"$')
+
+# metrics where a higher value is better; the rest are better lower
+HIGHER_IS_BETTER = {"connect_per_sec", "bytes_per_sec"}
+
+
+class _FleetServer(asyncssh.SSHServer):
+    def begin_auth(self, username):
+        return False
+
+
+class _FakeShell:
+    # Answers the lines SSHTargetNode writes to its shell: a command gets
+    # output_bytes of output after latency seconds, the done marker echo gets
+    # the marker with exit status 0, or 1 on failing nodes.
+
+    def __init__(self, output_bytes: int, latency: float, exit_status: int):
+        line = "x" * 79 + "\n"
+        self._payload = (line * (output_bytes // len(line) + 1))[:output_bytes]
+        self._latency = latency
+        self._exit_status = exit_status
+
+    async def __call__(self, process: asyncssh.SSHServerProcess):
+        try:
+            async for line in process.stdin:
+                match = _ECHO_RE.match(line.rstrip("\r\n"))
+                if match:
+                    process.stdout.write(f"{match.group(1)}:{self._exit_status}\n")
+                    continue
+                if self._latency:
+                    await asyncio.sleep(self._latency * random.uniform(0.5, 1.5))
+                process.stdout.write(self._payload)
+        except (asyncssh.Error, ConnectionError):
+            pass
+        process.exit(0)
+
+
+class Fleet:
+    # N ssh servers on 127.0.0.1, each on a port of its own. Unreachable
+    # nodes get a port that nothing listens on.
+
+    def __init__(self, size, output_bytes, latency, unreachable, failing):
+        self.size = size
+        self._output_bytes = output_bytes
+        self._latency = latency
+        self._unreachable = unreachable
+        self._failing = failing
+        self._servers = []
+        self.ports: List[int] = []
+
+    async def start(self):
+        host_key = asyncssh.generate_private_key("ssh-ed25519")
+        rng = random.Random(1)
+        for _ in range(self.size):
+            exit_status = 1 if rng.random() < self._failing else 0
+            server = await asyncssh.create_server(
+                _FleetServer,
+                "127.0.0.1",
+                0,
+                server_host_keys=[host_key],
+                process_factory=_FakeShell(self._output_bytes, self._latency, exit_status),
+            )
+            port = server.sockets[0].getsockname()[1]
+            if rng.random() < self._unreachable:
+                server.close()
+                await server.wait_closed()
+            else:
+                self._servers.append(server)
+            self.ports.append(port)
+
+    async def stop(self):
+        for server in self._servers:
+            server.close()
+        for server in self._servers:
+            await server.wait_closed()
+
+
+def _nodes(ports: List[int]) -> List[Node]:
+    budget = BufferBudget()
+    table = NodeTable(len(ports))
+    nodes = []
+    for idx, port in enumerate(ports):
+        node = Node(table, idx, OutputBuffer(budget=budget, max_spill_bytes=0))
+        node.ip_addr = "127.0.0.1"
+        node.port = port
+        node.login_user = "bench"
+        node.idx = idx
+        node.keepalive_interval = 0
+        nodes.append(node)
+    return nodes
+
+
+def _percentiles(prefix: str, values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    if not values:
+        return {}
+    return {
+        f"{prefix}_p50": percentile(values, 50),
+        f"{prefix}_p95": percentile(values, 95),
+        f"{prefix}_p99": percentile(values, 99),
+        f"{prefix}_max": values[-1],
+    }
+
+
+async def run_bench(args) -> Dict[str, float]:
+    fleet = Fleet(args.nodes, args.output_bytes, args.latency, args.unreachable, args.failing)
+    await fleet.start()
+    nodes = _nodes(fleet.ports)
+    engine = CommandEngine(nodes, lambda node=None: None, None, fanout=args.fanout)
+
+    start = time.monotonic()
+    await engine.warm_up()
+    connect_secs = time.monotonic() - start
+    connected = [node for node in nodes if node.connect_latency is not None]
+    results = {
+        "nodes": args.nodes,
+        "connected": len(connected),
+        "connect_secs": connect_secs,
+        "connect_per_sec": len(connected) / connect_secs,
+    }
+    results.update(_percentiles("connect", [node.connect_latency for node in connected]))
+
+    round_trips, wall_times = [], []
+    received = 0
+    for _ in range(args.commands):
+        for node in nodes:
+            node.recv_buf.clear()
+        start = time.monotonic()
+        await engine.run_cmd("bench")
+        wall_times.append(time.monotonic() - start)
+        for node in connected:
+            if node.cmd_duration is not None:
+                round_trips.append(node.cmd_duration)
+            received += node.recv_buf.bytes_received
+    command_secs = sum(wall_times)
+    results.update(_percentiles("rtt", round_trips))
+    results.update(_percentiles("cmd_wall", wall_times))
+    results["bytes_per_sec"] = received / command_secs if command_secs else 0.0
+    results["failed"] = sum(1 for node in connected if node.exit_status != 0)
+
+    for node in nodes:
+        node.disconnect()
+    await fleet.stop()
+    # kilobytes on Linux
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+
+def _format(name: str, value: float) -> str:
+    if name.endswith("_per_sec"):
+        return f"{value:,.0f}"
+    if name.endswith("_mb"):
+        return f"{value:.1f}"
+    if isinstance(value, float):
+        return f"{value * 1000:.1f} ms" if not name.endswith("_secs") else f"{value:.3f} s"
+    return str(value)
+
+
+def report(results: Dict[str, float], baseline: Optional[Dict[str, float]], tolerance: float) -> int:
+    # returns the number of metrics that regressed past tolerance
+    regressions = 0
+    for name, value in results.items():
+        line = f"{name:<16} {_format(name, value):>16}"
+        old = (baseline or {}).get(name)
+        if old and isinstance(value, float):
+            change = (value - old) / old
+            worse = -change if name in HIGHER_IS_BETTER else change
+            line += f"  {_format(name, old):>16}  {change:+7.1%}"
+            if worse > tolerance and name not in ("connect_secs",):
+                line += "  REGRESSION"
+                regressions += 1
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="picsh fan-out benchmark on loopback ssh servers")
+    parser.add_argument("--nodes", type=int, default=200, help="number of ssh servers (default 200)")
+    parser.add_argument("--commands", type=int, default=5, help="commands to run on every node (default 5)")
+    parser.add_argument("--output-bytes", type=int, default=4096, help="output per command per node (default 4096)")
+    parser.add_argument("--latency", type=float, default=0.0, help="mean server side delay before a command's output, seconds")
+    parser.add_argument("--unreachable", type=float, default=0.0, help="fraction of nodes that refuse connections")
+    parser.add_argument("--failing", type=float, default=0.0, help="fraction of nodes whose commands exit 1")
+    parser.add_argument("--fanout", type=int, default=DEFAULT_FANOUT, help=f"connect and command fan-out (default {DEFAULT_FANOUT})")
+    parser.add_argument("--json", metavar="FILE", help="save the results here")
+    parser.add_argument("--compare", metavar="FILE", help="show changes against results saved with --json, exit 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative change that counts as a regression (default 0.2)")
+    args = parser.parse_args()
+
+    limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if limit[0] < 4 * args.nodes + 64:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(limit[1], 4 * args.nodes + 64), limit[1]))
+
+    results = asyncio.get_event_loop().run_until_complete(run_bench(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+    regressions = report(results, baseline, args.tolerance)
+    if args.json:
+        with open(args.json, "w") as fh:
+            json.dump(results, fh, indent=2)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
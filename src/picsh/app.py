@@ -13,25 +13,23 @@
 
 import urwid
 from typing import List, Dict
+from picsh import startup_profile
 from picsh.controllers.cluster_selection_controller import ClusterSelectionController
-from picsh.controllers.cluster_shell_controller import ClusterShellController
-from picsh.controllers.node_panel_controller import NodePanelController
-from picsh.controllers.receive_buffer_controller import ReceiveBufferController
 from picsh.controllers.root_controller import RootController
-from picsh.controllers.single_shell_controller import SingleShellController
 from picsh.models.root_model import RootModel
+from picsh.repaint_scheduler import DEFAULT_MAX_FPS
 from picsh.state_change_notifier import StateChangeNotifier
 from picsh.views.cluster_selection_view import ClusterSelectionView
-from picsh.views.cluster_shell_view import ClusterShellView
-from picsh.views.node_panel_view import NodePanelView
-from picsh.views.receive_buffer_view import ReceiveBufferView
-from picsh.views.single_shell_view import SingleShellView
 
 
 class App:
-    def __init__(self, cluster_spec_paths: List[str], cluster_spec:Dict):
+    def __init__(self, cluster_spec_paths: List[str], cluster_spec:Dict, max_fps: int = DEFAULT_MAX_FPS, fanout: int = 0, record_dir: str = "", transfer_rate: int = 0):
         self._cluster_spec_paths: List[str] = cluster_spec_paths
         self._cluster_spec: Dict = cluster_spec
+        self._max_fps: int = max_fps
+        self._fanout: int = fanout
+        self._record_dir: str = record_dir
+        self._transfer_rate: int = transfer_rate
 
     def run(self):
         urwid.set_encoding("utf8")
@@ -49,12 +47,14 @@ class App:
             ("column_headers", "dark cyan", "black", "standout"),
             ("output_separater", "black", "dark gray", "standout"),
             ("cmdshell", "white", "black", "standout"),
+            ("search_match", "black", "yellow"),
         ]
 
-        root_model = RootModel(cluster_spec_paths=self._cluster_spec_paths, cluster_spec=self._cluster_spec)
+        root_model = RootModel(cluster_spec_paths=self._cluster_spec_paths, cluster_spec=self._cluster_spec, fanout=self._fanout, record_dir=self._record_dir, transfer_rate=self._transfer_rate)
         state_change_notifier = StateChangeNotifier(root_model.state_change_listener)
 
         root_controller = self._controller_hierarchy(palette, state_change_notifier, root_model)
+        startup_profile.mark("build ui")
         root_controller.run()
 
     def _controller_hierarchy(self, palette, state_change_notifier, root_model):
@@ -64,12 +64,37 @@ class App:
         #          -> ReceiveBufferController
         #          -> ClusterShellController
         #          -> SingleShellController
+        # the node panel is built on first use
 
         cluster_selection_view = ClusterSelectionView(state_change_notifier)
         cluster_selection_controller = ClusterSelectionController(
             cluster_selection_view, root_model, state_change_notifier
         )
 
+        root_controller = RootController(
+            palette,
+            root_model,
+            state_change_notifier,
+            cluster_selection_controller,
+            lambda: self._node_panel_hierarchy(state_change_notifier, root_model),
+            self._max_fps,
+        )
+
+        return root_controller
+
+    def _node_panel_hierarchy(self, state_change_notifier, root_model):
+        # imported here: these pull in the ssh stack, which the cluster
+        # selection screen does not need
+        from picsh.controllers.cluster_shell_controller import ClusterShellController
+        from picsh.controllers.node_panel_controller import NodePanelController
+        from picsh.controllers.receive_buffer_controller import ReceiveBufferController
+        from picsh.controllers.single_shell_controller import SingleShellController
+        from picsh.views.cluster_shell_view import ClusterShellView
+        from picsh.views.node_panel_view import NodePanelView
+        from picsh.views.receive_buffer_view import ReceiveBufferView
+        from picsh.views.single_shell_view import SingleShellView
+
+        startup_profile.mark("import node panel")
         receive_buffer_view = ReceiveBufferView(state_change_notifier)
         receive_buffer_controller = ReceiveBufferController(
             receive_buffer_view, root_model
@@ -96,13 +121,5 @@ class App:
             single_shell_controller,
             receive_buffer_controller,
         )
-
-        root_controller = RootController(
-            palette,
-            root_model,
-            state_change_notifier,
-            cluster_selection_controller,
-            node_panel_controller,
-        )
-
-        return root_controller
+        startup_profile.mark("build node panel")
+        return node_panel_controller
@@ -0,0 +1,180 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" non-interactive fan-out: run one command, stream prefixed output, exit """
+
+import asyncio
+import sys
+from typing import Dict, List, Optional, TextIO
+from picsh.command_engine import CommandEngine
+from picsh.fanout_window import DEFAULT_FANOUT, FanoutWindow
+from picsh.file_transfer import DEFAULT_TRANSFER_FANOUT, RateLimiter, pull, push
+from picsh.node_metrics import format_metric
+from picsh.node import ConnectionState, SSHTargetNode
+from picsh.node_selection import SelectionError
+from picsh.session_recorder import SessionRecorder, new_session_dir
+
+# exit status when a node could not be reached or lost its connection
+EXIT_UNREACHABLE = 255
+# exit status when the timeout expired before every node finished
+EXIT_TIMEOUT = 124
+
+
+class _PrefixedPrinter:
+    # writes each complete output line as "host: line" as soon as it arrives
+
+    def __init__(self, out: TextIO):
+        self._out = out
+        self._next_lineno: Dict[SSHTargetNode, int] = {}
+        self._closed = False
+
+    def on_output(self, node: Optional[SSHTargetNode] = None):
+        if self._closed or node is None:
+            return
+        if node.conn_state == ConnectionState.CONNECTING:
+            return
+        self._write_lines(node)
+        self._out.flush()
+
+    def flush(self, nodes: List[SSHTargetNode]):
+        # whatever is left, including unterminated last lines
+        self._closed = True
+        for node in nodes:
+            self._write_lines(node)
+            buf = node.recv_buf
+            tail_lineno = buf.first_lineno + buf.line_count() - 1
+            if buf.line_count() and self._next_lineno.get(node, 0) <= tail_lineno:
+                self._out.write(f"{node.get_ip()}: {buf.line(buf.line_count() - 1)}\n")
+        self._out.flush()
+
+    def _write_lines(self, node: SSHTargetNode):
+        buf = node.recv_buf
+        next_lineno = max(self._next_lineno.get(node, 0), buf.first_lineno)
+        lines = buf.complete_lines(next_lineno)
+        if lines:
+            prefix = f"{node.get_ip()}: "
+            self._out.write("".join(f"{prefix}{line}\n" for line in lines))
+        self._next_lineno[node] = next_lineno + len(lines)
+
+
+def _exit_status(nodes: List[SSHTargetNode]) -> int:
+    # 0 if every node succeeded, else the largest remote exit status, or 255
+    # if any node could not be reached
+    status = 0
+    for node in nodes:
+        if node.exit_status is None:
+            return EXIT_UNREACHABLE
+        status = max(status, node.exit_status)
+    return min(status, EXIT_UNREACHABLE)
+
+
+async def _run(
+    nodes: List[SSHTargetNode],
+    cmd: str,
+    fanout: int,
+    timeout: Optional[float],
+    out,
+    record_dir: Optional[str],
+) -> int:
+    printer = _PrefixedPrinter(out)
+    recorder = SessionRecorder(new_session_dir(record_dir)) if record_dir else None
+    for node in nodes:
+        node.register_notify(printer.on_output)
+        if recorder:
+            node.register_recorder(recorder)
+    engine = CommandEngine(nodes, printer.on_output, None, fanout=fanout)
+    status = None
+    try:
+        target_nodes, cmd = engine.target_nodes(cmd)
+    except SelectionError as ex:
+        print(f"picsh: {ex}", file=sys.stderr)
+        if recorder:
+            recorder.close()
+        return 2
+    try:
+        await asyncio.wait_for(engine.run_cmd_on(target_nodes, cmd), timeout)
+    except asyncio.TimeoutError:
+        status = EXIT_TIMEOUT
+    printer.flush(target_nodes)
+    unfinished = [node.get_ip() for node in target_nodes if node.exit_status is None]
+    if status == EXIT_TIMEOUT and unfinished:
+        print(f"picsh: timed out waiting for {' '.join(unfinished)}", file=sys.stderr)
+    for node in nodes:
+        node.disconnect()
+    if recorder:
+        recorder.close()
+    return status if status is not None else _exit_status(target_nodes)
+
+
+def run_batch(
+    nodes: List[SSHTargetNode],
+    cmd: str,
+    fanout: int,
+    timeout: Optional[float] = None,
+    record_dir: Optional[str] = None,
+    out: TextIO = sys.stdout,
+) -> int:
+    loop = asyncio.get_event_loop()
+    return loop.run_until_complete(_run(nodes, cmd, fanout, timeout, out, record_dir))
+
+
+async def _transfer(
+    nodes: List[SSHTargetNode], kind: str, transfer, timeout: Optional[float], out
+) -> int:
+    status = 0
+    try:
+        await asyncio.wait_for(transfer, timeout)
+    except OSError as ex:
+        print(f"picsh: {ex}", file=sys.stderr)
+        return 2
+    except asyncio.TimeoutError:
+        status = EXIT_TIMEOUT
+    for node in nodes:
+        progress = node.transfer
+        if progress is None or not progress.finished:
+            out.write(f"{node.get_ip()}: {kind} did not finish\n")
+            status = status or EXIT_TIMEOUT
+        elif progress.error:
+            out.write(f"{node.get_ip()}: {kind} failed: {progress.error}\n")
+            status = status or 1
+        else:
+            out.write(
+                f"{node.get_ip()}: {kind}ed {progress.done_bytes} bytes in "
+                f"{progress.elapsed():.2f}s ({format_metric('xfer', progress.rate())})\n"
+            )
+    out.flush()
+    for node in nodes:
+        node.disconnect()
+    return status
+
+
+def run_transfer(
+    nodes: List[SSHTargetNode],
+    kind: str,
+    path: str,
+    dest: str,
+    timeout: Optional[float] = None,
+    rate: int = 0,
+    out: TextIO = sys.stdout,
+    fanout: int = DEFAULT_FANOUT,
+) -> int:
+    # kind "push": path is local, dest a remote directory; kind "pull": path
+    # is a remote glob, dest a local directory. Exit status 0 if every node
+    # succeeded, 1 if any failed, 124 on timeout.
+    window = FanoutWindow(DEFAULT_TRANSFER_FANOUT)
+    limiter = RateLimiter(rate)
+    func = push if kind == "push" else pull
+    # handshakes to cold nodes are bounded by the fanout, like for -c
+    connect_window = FanoutWindow(fanout)
+    transfer = func(nodes, path, dest, window, lambda node=None: None, limiter, connect_window)
+    loop = asyncio.get_event_loop()
+    return loop.run_until_complete(_transfer(nodes, kind, transfer, timeout, out))
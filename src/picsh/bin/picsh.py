@@ -1,17 +1,14 @@
 #!/usr/bin/env python3
+from picsh import startup_profile
 import logging
 import warnings
 
 warnings.filterwarnings("ignore", module="asyncssh\.crypto.*")
 import sys
 import os
-import colorama
 import argparse
-from picsh.controllers.root_controller import RootController
-from picsh.util import get_logo, get_tagline
+from picsh.util import get_logo, get_tagline, parse_rate
 import glob
-import yaml
-from picsh.app import App
 
 
 if sys.version_info.major < 3 or (sys.version_info.major == 3 and sys.version_info.minor < 6):
@@ -40,6 +37,8 @@ def _get_cluster_specs(picsh_dir):
 
 
 def _no_clusters_usage(picsh_dir):
+    import colorama
+
     print(
         "No cluster definitions found in [%s%s%s]"
         % (colorama.Fore.GREEN, picsh_dir, colorama.Style.RESET_ALL)
@@ -70,21 +69,67 @@ def _build_cluster_spec_from_args(args):
         "ssh_key_path": args.identity_file or "",
         "nodes" : []
     }
+    if args.jump:
+        spec["jump_host"] = args.jump
     for host in args.hosts:
         spec["nodes"].append({"ip": host})
     logging.info(f"spec from args: {str(spec)}")
     return spec
 
 
+def _run_batch(args, cluster_spec):
+    # headless: no urwid, output goes to stdout prefixed with the host
+    from picsh.batch import run_batch, run_transfer
+    from picsh.cluster_spec import FileClusterSpec, ObjClusterSpec
+    from picsh.exceptions.picsh_exception import PicshException
+
+    startup_profile.mark("import batch")
+    try:
+        spec = FileClusterSpec(args.spec) if args.spec else ObjClusterSpec(cluster_spec)
+    except PicshException as ex:
+        print(f"picsh: {ex}", file=sys.stderr)
+        sys.exit(2)
+    startup_profile.mark("load cluster spec")
+    if args.push:
+        status = run_transfer(spec.nodes, "push", args.push, args.dest or ".", args.timeout, args.bwlimit, fanout=args.fanout or spec.fanout)
+    elif args.pull:
+        status = run_transfer(spec.nodes, "pull", args.pull, args.dest, args.timeout, args.bwlimit, fanout=args.fanout or spec.fanout)
+    else:
+        status = run_batch(spec.nodes, args.command, args.fanout or spec.fanout, args.timeout, args.record)
+    spec.close()
+    sys.exit(status)
+
+
 def main():
+    startup_profile.mark("import picsh")
     parser = argparse.ArgumentParser(description='Parallel Interactive Cluster Shell', add_help=False)
+    parser.add_argument('--help', help='show this help message and exit', action='help')
     parser.add_argument('-v', '--verbose', help='Log verbosely to ~/picsh.log', action='store_true', default=False)
     parser.add_argument('-i', '--identity_file', help='ssh private key file for login')
     parser.add_argument('-l', '--login_name', help='login user name')
     parser.add_argument('-h', '--hosts', help='space separated host ips', nargs='*')
+    parser.add_argument('-J', '--jump', help='reach the hosts through this bastion, [user@]host[:port]', metavar='HOST')
+    parser.add_argument('-c', '--command', help='run this command on every node, print the output and exit')
+    parser.add_argument('--push', help='copy this local file or directory to every node and exit', metavar='PATH')
+    parser.add_argument('--pull', help='copy the remote files matching this glob from every node into DEST/<idx>-<ip>/, gzipped, and exit', metavar='GLOB')
+    parser.add_argument('--dest', help='with --push, the remote directory to copy into (default: home directory); with --pull, the local directory (default ~/.picsh/pull)')
+    parser.add_argument('--bwlimit', help='cap the total bandwidth of --push/--pull and :push/:pull, e.g. 50M (bytes/sec)', type=parse_rate, default=0)
+    parser.add_argument('--spec', help='cluster spec yaml file to use')
+    parser.add_argument('--timeout', help='with -c, --push or --pull, give up on nodes that have not finished after this many seconds', type=float)
+    parser.add_argument('--fanout', help='max concurrent ssh handshakes and command dispatches (default 64, overrides the spec)', type=int, default=0)
+    parser.add_argument('--record', help='save every node\'s output under DIR (default ~/.picsh/sessions)', nargs='?', const='', metavar='DIR')
+    parser.add_argument('--max-fps', help='maximum screen repaints per second (default 30)', type=int, default=30)
+    parser.add_argument('--startup-profile', help='print the time spent in each startup phase on exit', action='store_true', default=False)
     args = parser.parse_args()
+    if args.startup_profile:
+        startup_profile.enable()
+    startup_profile.mark("parse args")
 
     picsh_dir = _get_picsh_dir()
+    if args.record == '':
+        args.record = os.path.join(picsh_dir, "sessions")
+    if args.pull and not args.dest:
+        args.dest = os.path.join(picsh_dir, "pull")
 
     if args.verbose:
         logging.basicConfig(
@@ -98,15 +143,26 @@ def main():
 
     cluster_spec = {}
     cluster_spec_paths = []
+    if args.command or args.push or args.pull:
+        if not args.hosts and not args.spec:
+            parser.error("-c, --push and --pull need hosts (-h) or a cluster spec (--spec)")
+        _run_batch(args, _build_cluster_spec_from_args(args) if args.hosts else {})
     if args.hosts:
         cluster_spec = _build_cluster_spec_from_args(args)
+    elif args.spec:
+        cluster_spec_paths = [args.spec]
     else:
         cluster_spec_paths = _get_cluster_specs(picsh_dir)
         if len(cluster_spec_paths) == 0:
             _no_clusters_usage(picsh_dir)
             sys.exit(0)
 
-    App(cluster_spec_paths, cluster_spec).run()
+    from picsh.app import App
+
+    startup_profile.mark("import ui")
+    App(cluster_spec_paths, cluster_spec, args.max_fps, args.fanout, args.record or "", args.bwlimit).run()
+
+    import colorama
 
     print(get_logo())
     print(colorama.Fore.CYAN)
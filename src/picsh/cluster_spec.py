@@ -12,10 +12,26 @@
 
 
 import os
-import yaml
 from typing import Optional, Dict
 from picsh.exceptions.picsh_exception import PicshException
-from picsh.node import Node
+from picsh.node import Node, DEFAULT_KEEPALIVE_INTERVAL
+from picsh.node_table import NodeTable
+from picsh.fanout_window import DEFAULT_FANOUT
+from picsh.output_buffer import (
+    BufferBudget,
+    OutputBuffer,
+    DEFAULT_NODE_OUTPUT_BYTES,
+    DEFAULT_NODE_SPILL_BYTES,
+    DEFAULT_TOTAL_OUTPUT_BYTES,
+    DEFAULT_TOTAL_SPILL_BYTES,
+)
+from picsh.jump_hosts import JumpHost, DEFAULT_JUMP_CONNECTIONS
+from picsh.spec_cache import load_spec_yaml
+from picsh.relays import (
+    assign_relays,
+    DEFAULT_RELAY_MAX_LEAVES,
+    DEFAULT_RELAY_PREFIX,
+)
 
 
 class ClusterSpec:
@@ -23,17 +39,91 @@ class ClusterSpec:
         # globals
         hydrated_nodes = []
         login_user = cluster.get("login_user")
+        port = cluster.get("port") or 22
         key_path = cluster.get("ssh_key_path")
         self.name = cluster.get("cluster_name")
-        for idx, node in enumerate(cluster.get("nodes")):
-            n = Node()
+        self.fanout = cluster.get("fanout") or DEFAULT_FANOUT
+        node_output_bytes = (
+            cluster.get("max_node_output_bytes") or DEFAULT_NODE_OUTPUT_BYTES
+        )
+        node_spill_bytes = cluster.get("max_node_spill_bytes")
+        if node_spill_bytes is None:
+            node_spill_bytes = DEFAULT_NODE_SPILL_BYTES
+        budget = BufferBudget(
+            cluster.get("max_total_output_bytes") or DEFAULT_TOTAL_OUTPUT_BYTES,
+            cluster.get("max_total_spill_bytes") or DEFAULT_TOTAL_SPILL_BYTES,
+        )
+        keepalive_interval = cluster.get("keepalive_interval")
+        if keepalive_interval is None:
+            keepalive_interval = DEFAULT_KEEPALIVE_INTERVAL
+        jump_host = cluster.get("jump_host")
+        jump_connections = cluster.get("jump_connections") or DEFAULT_JUMP_CONNECTIONS
+        # nodes naming the same bastion share its connections
+        jump_hosts: Dict[str, JumpHost] = {}
+        self.jump_hosts = jump_hosts
+        node_relays = {}
+        # groups: {group: [node ip or name, ...]}, a tag for each member
+        group_tags: Dict[str, set] = {}
+        for group, members in (cluster.get("groups") or {}).items():
+            for member in members:
+                group_tags.setdefault(str(member), set()).add(str(group))
+        node_specs = cluster.get("nodes")
+        # one row per node, the nodes share it
+        self.node_table = NodeTable(len(node_specs))
+        for idx, node in enumerate(node_specs):
+            n = Node(
+                self.node_table,
+                idx,
+                OutputBuffer(
+                    node.get("max_node_output_bytes") or node_output_bytes,
+                    budget,
+                    node_spill_bytes,
+                ),
+            )
             n.ip_addr = node["ip"]
+            n.port = node.get("port") or port
+            n.name = node.get("name") or ""
+            tags = node.get("tags")
+            tags = frozenset(str(tag) for tag in tags) if tags else frozenset()
+            if group_tags:
+                tags = tags.union(
+                    group_tags.get(n.ip_addr, ()), group_tags.get(n.name, ())
+                )
+            # untagged nodes keep sharing Node's empty default
+            if tags:
+                n.tags = tags
             n.login_user = node.get("login_user") or login_user
             n.ssh_key_path = node.get("ssh_key_path") or key_path
             n.idx = idx
+            n.keepalive_interval = keepalive_interval
+            node_jump_host = node.get("jump_host") or jump_host
+            if node_jump_host and str(node_jump_host).lower() != "none":
+                if node_jump_host not in jump_hosts:
+                    jump_hosts[node_jump_host] = JumpHost(
+                        node_jump_host,
+                        login_user,
+                        key_path,
+                        jump_connections,
+                        keepalive_interval,
+                    )
+                n.jump_host = jump_hosts[node_jump_host]
+            if node.get("relay") is not None:
+                node_relays[n] = node["relay"]
             hydrated_nodes.append(n)
+        assign_relays(
+            hydrated_nodes,
+            cluster.get("relays"),
+            cluster.get("relay_prefix") or DEFAULT_RELAY_PREFIX,
+            cluster.get("relay_max_leaves") or DEFAULT_RELAY_MAX_LEAVES,
+            node_relays,
+        )
         return hydrated_nodes
 
+    def close(self):
+        # the bastion connections, shared by the nodes, once they are done
+        for jump_host in self.jump_hosts.values():
+            jump_host.close()
+
 
 class FileClusterSpec(ClusterSpec):
     def __init__(self, path_to_yaml: str):
@@ -41,8 +131,7 @@ class FileClusterSpec(ClusterSpec):
             raise PicshException(
                 f"Cluster spec [{path_to_yaml}] yaml file does not exist."
             )
-        with open(path_to_yaml, "r") as fh:
-            self.cluster_spec = yaml.safe_load(fh.read())
+        self.cluster_spec = load_spec_yaml(path_to_yaml)
         self.nodes = self._nodes_from_cluster_spec(self.cluster_spec)
 
 
@@ -12,67 +12,84 @@
 
 
 from typing import Optional
-import asyncio, asyncssh
-from functools import partial
-from picsh.node import Node
-
-
-class InteractiveClientSession(asyncssh.SSHClientSession):
-    login_complete_guid = "B79D8677-F58A-4E09-B917-855A6619A951"
-
-    def __init__(self, node: Node, notify_func):
-        self._node = node
-        self._login_guid_found = False
-        self._notify_func = notify_func
-
-    def data_received(self, data: str, datatype: asyncssh.DataType) -> None:
-        self._node.recv_buf += data
-        # if not self._login_guid_found:
-        #     # surpress login banner.
-        #     # Note: RFC-4254 reccomends the use of magic cookeis to surpress spurious
-        #     # output when starting a subsystem via the shell "to distinguish it from
-        #     # arbitrary output generated by shell initialization scripts, etc. This spurious
-        #     # output from the shell may be filtered out either at the server or at the client"
-        #     pos1 = self._node.recv_buf.find(InteractiveClientSession.login_complete_guid)
-        #     if pos1 != -1:
-        #         self._login_guid_found = True
-        #         guid_len = len(InteractiveClientSession.login_complete_guid)
-        #         self._node.recv_buf = self._node.recv_buf[pos1 + guid_len + 1:]
-        if self._node.recv_buf:
-            self._notify_func()
-
-    def connection_lost(self, exc: Optional[Exception]) -> None:
-        err_str = "\npicsh: Connection lost. "
-        if exc:
-            err_str += "SSH session error: " + str(exc)
-        self._node.recv_buf += err_str
-        self._notify_func()
+import asyncio
+import logging
+from picsh.fanout_window import FanoutWindow, DEFAULT_FANOUT
+from picsh.node_selection import NodeSelector, SelectionError
+from picsh.reconnect import Reconnector
 
 
 class CommandEngine:
-    def __init__(self, nodes, notify_func, command_queue, loop=None):
+    def __init__(
+        self, nodes, notify_func, command_queue, loop=None, fanout=DEFAULT_FANOUT
+    ):
         self._nodes = nodes
         self._notify_func = notify_func
         self._command_queue = command_queue
         self.done = False
-        self._connections = {}
-        self._sessions = {}
         self._using = []
         self._loop = loop
+        # separate windows so queued handshakes do not hold up commands to
+        # nodes that are already connected
+        self.connect_window = FanoutWindow(fanout)
+        self.command_window = FanoutWindow(fanout)
+        # reconnects share the handshake cap with everything else
+        self.reconnector = Reconnector(self.connect_window)
+        self._selector: Optional[NodeSelector] = None
+        self._message_handler = None
 
     def get_node_selection(self):
         return self._using
 
+    def set_message_handler(self, handler):
+        self._message_handler = handler
+
+    def _message(self, text):
+        if self._message_handler:
+            self._message_handler(text)
+        else:
+            logging.error(text)
+
+    def set_fanout(self, fanout):
+        self.connect_window.resize(fanout)
+        self.command_window.resize(fanout)
+
+    async def warm_up(self):
+        # open connections to every node ahead of the first command
+        loop = self._loop or asyncio.get_event_loop()
+        tasks = [
+            loop.create_task(node.warm_up(self.connect_window)) for node in self._nodes
+        ]
+        for task in tasks:
+            await task
+
+    async def run_cmd(self, cmd):
+        # run one (optionally @ targeted) command line and wait until every
+        # targeted node has finished it
+        target_nodes, cmd = self.target_nodes(cmd)
+        await self.run_cmd_on(target_nodes, cmd)
+        return target_nodes
+
+    async def run_cmd_on(self, nodes, cmd):
+        # run cmd (without an @ part) on nodes and wait until all finished it
+        await self._run_cmd_on_nodes(cmd, nodes)
+        for node in nodes:
+            await node.wait_cmd_done()
+
     async def _run_cmd_on_nodes(self, cmd, nodes):
         loop = self._loop or asyncio.get_event_loop()
         tasks = []
         for node in nodes:
-            t = loop.create_task(node.run_cmd(cmd))
+            t = loop.create_task(self._run_cmd_on_node(cmd, node))
             tasks.append(t)
 
         for task in tasks:
             await task
 
+    async def _run_cmd_on_node(self, cmd, node):
+        async with self.command_window:
+            await node.run_cmd(cmd, self.connect_window)
+
     async def run_command_loop(self):
         while not self.done:
             cmd: str = await self._command_queue.get()
@@ -87,59 +104,37 @@ class CommandEngine:
                         target_nodes, cmd = self.target_nodes_from_at_str(cmd)
                         if not cmd.strip():
                             self._using = target_nodes
+                            using = set(target_nodes)
                             for node in self._nodes:
-                                if node not in self._using:
-                                    node.hide = True
+                                node.hide = node not in using
                             self._notify_func()
                         else:
                             await self._run_cmd_on_nodes(cmd, target_nodes)
                     else:
                         target_nodes = self._using or self._nodes
                         await self._run_cmd_on_nodes(cmd, target_nodes)
+            except SelectionError as ex:
+                self._message(str(ex))
             except Exception as ex:
-                # TODO: send on control channel
-                print("Oops. Error: " + str(ex))
+                logging.exception("command failed")
+                self._message(f"error: {ex}")
+
+    def target_nodes(self, cmd):
+        # the nodes a (possibly @ targeted) command line is for, and the
+        # command without the @ part
+        if cmd.startswith("@"):
+            return self.target_nodes_from_at_str(cmd)
+        return self._using or self._nodes, cmd
 
     def target_nodes_from_at_str(self, cmd):
+        # "@<selection> cmd", see node_selection; raises SelectionError
         parts = cmd.split()
-        target_node_str = parts[0][1:]
-        targets = target_node_str.split(",")
-        target_idxs = [int(t.strip()) for t in targets]
-        target_nodes = []
-        for node in self._nodes:
-            if node.idx in target_idxs:
-                target_nodes.append(node)
+        target_nodes = self._node_selector().select(parts[0][1:])
         cmd = cmd[len(parts[0]) :]
         return target_nodes, cmd
 
-    async def ensure_session(self, node):
-        node_id = node.idx
-        conn = self._connections.get(node_id)
-        if not conn:
-            conn = await self._make_connection(node)
-            self._connections[node_id] = conn
-        session_tuple = self._sessions.get(node_id)
-        if not session_tuple:
-            ssh_client_factory = partial(
-                InteractiveClientSession, node, self._notify_func
-            )
-            session_tuple = await conn.create_session(ssh_client_factory)
-            self._sessions[node_id] = session_tuple
-        chan, sess = session_tuple
-        return chan, sess
-
-    async def _cmd(self, node, scmd: str):
-        chan, sess = await self.ensure_session(node)
-        chan.write(scmd + "\n")
-
-    async def _make_connection(self, node: Node):
-        conn, client = await asyncssh.create_connection(
-            client_factory=None,
-            host=node.ip_addr,
-            username=node.login_user,
-            known_hosts=None,
-            options=asyncssh.SSHClientConnectionOptions(
-                client_keys=node.ssh_key_path, username=node.login_user
-            ),
-        )
-        return conn
+    def _node_selector(self):
+        # the node list is filled in place once a cluster is loaded
+        if self._selector is None or self._selector.nodes != self._nodes:
+            self._selector = NodeSelector(self._nodes)
+        return self._selector
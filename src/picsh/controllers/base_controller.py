@@ -6,6 +6,8 @@ class BaseController:
         self._aio_event_loop = None
         self.child_controllers: List["BaseController"] = []
         self._repaint_notifier = None
+        self._repaint_scheduler = None
+        self._dirty_nodes = None
 
     def register_child_controller(self, controller: "BaseController"):
         controller.set_repaint_notifier(self.repaint_notifer)
@@ -21,6 +23,11 @@ class BaseController:
         for c in self.child_controllers:
             c.set_aio_event_loop(aio_event_loop)
 
+    def set_repaint_scheduler(self, repaint_scheduler):
+        self._repaint_scheduler = repaint_scheduler
+        for c in self.child_controllers:
+            c.set_repaint_scheduler(repaint_scheduler)
+
     def activate(self, **kwargs):
         pass
 
@@ -33,17 +40,31 @@ class BaseController:
     def switch_to(self):
         pass
 
-    def repaint(self):
+    def repaint(self, dirty_nodes=None):
+        # dirty_nodes: nodes whose output changed since the last repaint,
+        # None if anything may have changed
         pass
 
-    def repaint_notifer(self):
+    def repaint_notifer(self, node=None):
         # child nodes can notify a parent node to repaint the tree
-        self.repaint()
-        for c in self.child_controllers:
-            c.repaint()
+        # with a scheduler, bursts of notifications collapse into one frame
+        if node is None:
+            self._dirty_nodes = None
+        elif self._dirty_nodes is not None:
+            self._dirty_nodes.add(node)
+        if self._repaint_scheduler:
+            self._repaint_scheduler.request(self.repaint_tree)
+            return
+        self.repaint_tree()
         if self._urwid_loop:
             self._urwid_loop.draw_screen()
 
+    def repaint_tree(self):
+        dirty_nodes, self._dirty_nodes = self._dirty_nodes, set()
+        self.repaint(dirty_nodes)
+        for c in self.child_controllers:
+            c.repaint(dirty_nodes)
+
     def set_repaint_notifier(self, notifier):
         self._repaint_notifier = notifier
 
@@ -10,14 +10,28 @@
 # FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
 #
 import logging
+import os
 import urwid
 from picsh.controllers.base_controller import BaseController
 from picsh.state_change_notifier import StateChangeNotifier
 from picsh.views.cluster_selection_view import ClusterSelectionView
 from picsh.models.root_model import RootModel
-from picsh.cluster_spec import FileClusterSpec
 from picsh.views.view_names import ViewNames
 
+# wait this long after the cursor stops before reading the spec to preview
+PREVIEW_DELAY = 0.1
+# only the start of a large spec is previewed
+PREVIEW_MAX_BYTES = 64 * 1024
+
+
+def _read_preview(path: str) -> str:
+    with open(path, "rt", errors="replace") as fh:
+        text = fh.read(PREVIEW_MAX_BYTES + 1)
+    if len(text) > PREVIEW_MAX_BYTES:
+        size = os.path.getsize(path)
+        text = text[:PREVIEW_MAX_BYTES] + f"\n... ({size} bytes, preview truncated)"
+    return text
+
 
 class ClusterSelectionController(BaseController):
     def __init__(
@@ -32,17 +46,59 @@ class ClusterSelectionController(BaseController):
         self._state_change_notifier: StateChangeNotifier = state_change_notifier
         self.view.set_cluster_specs(model.cluster_spec_paths)
         urwid.connect_signal(self.view.listbox_content, "modified", self.on_modified)
+        self._preview_handle = None
+        self._preview_task = None
+
+    def activate(self, **kwargs):
+        self.on_modified()
 
     def on_modified(self):
-        self.view.show_cluster_spec(self._model.cluster_spec_paths)
+        # cursor moves only (re)arm a timer; the file is read in a worker
+        # thread once the cursor rests
+        if self._aio_event_loop is None:
+            return
+        if self._preview_handle:
+            self._preview_handle.cancel()
+        self._preview_handle = self._aio_event_loop.call_later(
+            PREVIEW_DELAY, self._start_preview
+        )
+
+    def _start_preview(self):
+        self._preview_handle = None
+        spec_idx = self.view.get_selected_spec_idx()
+        if 0 <= spec_idx < len(self._model.cluster_spec_paths):
+            # a newer selection supersedes the preview still being read
+            if self._preview_task:
+                self._preview_task.cancel()
+            self._preview_task = self._aio_event_loop.create_task(self._preview(spec_idx))
+
+    async def _preview(self, spec_idx):
+        path = self._model.cluster_spec_paths[spec_idx]
+        try:
+            text = await self._aio_event_loop.run_in_executor(None, _read_preview, path)
+        except OSError as ex:
+            text = f"cannot read {path}: {ex}"
+        if spec_idx != self.view.get_selected_spec_idx():
+            return
+        self.view.show_cluster_spec(text)
+        if self._urwid_loop:
+            self._urwid_loop.draw_screen()
 
     def handle_input_filter(self, keys, raw_input):
         new_view = None
         if "enter" in keys:
             nodeidx = self.view.get_selected_spec_idx()
             cluster_spec_path = self._model.cluster_spec_paths[nodeidx]
+            from picsh.cluster_spec import FileClusterSpec
+
             cluster_spec = FileClusterSpec(cluster_spec_path)
-            self._state_change_notifier.notify({"nodes": cluster_spec.nodes})
+            self._state_change_notifier.notify(
+                {
+                    "nodes": cluster_spec.nodes,
+                    "node_table": cluster_spec.node_table,
+                    "fanout": self._model.fanout or cluster_spec.fanout,
+                }
+            )
             keys = []
             new_view = ViewNames.NODE_PANEL_VIEW
         elif "ctrl c" in keys:
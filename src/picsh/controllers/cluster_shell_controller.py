@@ -15,11 +15,18 @@ import os
 import asyncio
 import urwid
 import concurrent.futures
+import shlex
 from collections import defaultdict
 from picsh.views.cluster_shell_view import ClusterShellView
 from picsh.views.view_names import ViewNames
 from picsh.models.root_model import RootModel
 from picsh.command_engine import CommandEngine
+from picsh.fanout_window import FanoutWindow
+from picsh.file_transfer import DEFAULT_TRANSFER_FANOUT, RateLimiter, pull, push
+from picsh.node import CommandState
+from picsh.node_selection import SelectionError
+from picsh.output_grouper import format_node_ranges
+from picsh.session_recorder import SessionRecorder, new_session_dir
 from picsh.controllers.base_controller import BaseController
 import readline
 
@@ -63,12 +70,18 @@ class ClusterShellController(BaseController):
         )
         self._terminal_proc = _TerminalSubProcess()
         self._activated = False
+        self._recorder = None
+        self._search_handler = None
+        self._message_handler = None
+        self._command_engine.set_message_handler(self._message)
+        self._transfer_window = FanoutWindow(DEFAULT_TRANSFER_FANOUT)
+        self._rate_limiter = RateLimiter(root_model.transfer_rate)
 
-    def on_command_output(self):
-        self._repaint_notifier()
+    def on_command_output(self, node=None):
+        self._repaint_notifier(node)
 
-    def repaint(self):
-        self.view.repaint_shell_output(self._model.nodes)
+    def repaint(self, dirty_nodes=None):
+        self.view.repaint_shell_output(self._model.nodes, dirty_nodes)
 
     def activate(self, **kwargs):
         if not self._activated:
@@ -89,19 +102,131 @@ class ClusterShellController(BaseController):
     def start_command_loop(self, aioloop):
         aioloop.create_task(self._command_engine.run_command_loop())
 
+    def warm_up_connections(self):
+        self._command_engine.set_fanout(self._model.fanout)
+        if self._model.record_dir and not self._recorder:
+            self._recorder = SessionRecorder(new_session_dir(self._model.record_dir))
+            for node in self._model.nodes:
+                node.register_recorder(self._recorder)
+        for node in self._model.nodes:
+            node.register_reconnector(self._command_engine.reconnector)
+        self._aio_event_loop.create_task(self._command_engine.warm_up())
+
+    def status_text(self):
+        # live fan-out counters, shown while handshakes or commands are pending
+        parts = []
+        for name, window in (
+            ("connect", self._command_engine.connect_window),
+            ("cmd", self._command_engine.command_window),
+            ("xfer", self._transfer_window),
+        ):
+            if window.in_flight or window.queued:
+                parts.append(
+                    f"{name}: {window.in_flight} active {window.queued} queued {window.completed} done"
+                )
+        reconnector = self._command_engine.reconnector
+        if reconnector.pending:
+            parts.append(f"{reconnector.pending} reconnecting")
+        table = self._model.node_table
+        if table:
+            running = table.count("cmd_state", CommandState.RUNNING)
+        else:
+            running = sum(node.cmd_state == CommandState.RUNNING for node in self._model.nodes)
+        if running:
+            parts.append(f"{running} running")
+        return " | ".join(parts)
+
+    def set_search_handler(self, handler):
+        self._search_handler = handler
+
+    def set_message_handler(self, handler):
+        self._message_handler = handler
+
+    def _message(self, text):
+        if self._message_handler:
+            self._message_handler(text)
+
     def on_data_pipe_data(self, s_cmdline):
         s_cmdline = s_cmdline.decode("utf-8")
+        if self._run_local_command(s_cmdline):
+            return
         self._reset_buffers()
         self._command_queue.put_nowait(s_cmdline)
 
+    def _run_local_command(self, cmdline):
+        # picsh's own ":" commands, optionally @ targeted; nothing is sent to
+        # the nodes. Returns False for anything else.
+        rest = cmdline.split(None, 1)[1] if cmdline.startswith("@") else cmdline
+        words = rest.split(None, 1)
+        if not words or words[0] not in (":find", ":push", ":pull"):
+            return False
+        args = words[1] if len(words) > 1 else ""
+        if words[0] == ":find":
+            if self._search_handler:
+                self._search_handler(args)
+            return True
+        try:
+            target_nodes, _ = self._command_engine.target_nodes(cmdline)
+            paths = shlex.split(args)
+        except (ValueError, SelectionError) as ex:
+            self._message(f"{words[0][1:]}: {ex}")
+            return True
+        if len(paths) not in (1, 2):
+            if words[0] == ":push":
+                self._message("usage: :push LOCAL_PATH [REMOTE_DIR]")
+            else:
+                self._message("usage: :pull REMOTE_GLOB [LOCAL_DIR]")
+            return True
+        if words[0] == ":push":
+            dest = paths[1] if len(paths) == 2 else "."
+            transfer = push
+        else:
+            dest = paths[1] if len(paths) == 2 else os.path.expanduser("~/.picsh/pull")
+            transfer = pull
+        self._aio_event_loop.create_task(
+            self._transfer(words[0][1:], transfer, target_nodes, paths[0], dest)
+        )
+        return True
+
+    async def _transfer(self, kind, transfer, nodes, path, dest):
+        self._message(f"{kind}ing {path} on {len(nodes)} nodes ...")
+        try:
+            results = await transfer(
+                nodes,
+                path,
+                dest,
+                self._transfer_window,
+                self.on_command_output,
+                self._rate_limiter,
+                self._command_engine.connect_window,
+            )
+        except OSError as ex:
+            self._message(f"{kind}: {ex}")
+            return
+        failed = [node.idx for node, progress in results.items() if progress.error]
+        text = f"{kind}ed {path} on {len(nodes) - len(failed)} nodes"
+        if kind == "pull":
+            text += f" into {dest}"
+        if failed:
+            text += f", failed on [{format_node_ranges(failed)}]"
+        self._message(text)
+
+    def reconnect_all(self):
+        count = self._command_engine.reconnector.reconnect_all(self._model.nodes)
+        self._message(f"reconnecting {count} nodes" if count else "all nodes are connected")
+
     def _reset_buffers(self):
         for node in self._model.nodes:
-            node.recv_buf = ""
+            node.recv_buf.clear()
+        self.on_command_output()
 
     def on_control_pipe_data(self, data):
         raise urwid.ExitMainLoop()
 
     def quit(self):
+        self._command_engine.reconnector.close()
+        if self._recorder:
+            self._recorder.close()
         if self.view.term and self.view.term.pid:
             self.view.term.terminate()
 
@@ -110,6 +235,10 @@ class ClusterShellController(BaseController):
         if "ctrl b" in keys:
             keys = []
             new_view = ViewNames.BUFFER_VIEW
+        elif "ctrl g" in keys:
+            keys = []
+            self.view.toggle_grouping()
+            self.on_command_output()
         return keys, new_view
 
     def want_focus(self):
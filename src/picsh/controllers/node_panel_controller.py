@@ -1,4 +1,7 @@
 import logging
+import os
+import re
+import time
 import urwid
 from picsh.controllers.cluster_selection_controller import ClusterSelectionController
 from picsh.controllers.receive_buffer_controller import ReceiveBufferController
@@ -7,6 +10,14 @@ from picsh.models.root_model import RootModel
 from picsh.views.node_panel_view import NodePanelView
 from picsh.views.view_names import ViewNames
 from picsh.controllers.base_controller import BaseController
+from picsh.node_metrics import METRIC_NAMES, dump_metrics
+from picsh.output_grouper import format_node_ranges
+from picsh.output_search import OutputSearch
+from picsh.node import CommandState
+
+# seconds between refreshes of the metric summary and of the rows of nodes
+# still running a command, whose duration and rate change without output
+METRICS_REFRESH_INTERVAL = 1.0
 
 
 class NodePanelController(BaseController):
@@ -37,6 +48,14 @@ class NodePanelController(BaseController):
         self._active_view_name = ViewNames.CLUSTERSHELL_VIEW
 
         self._activated = False
+        self._refresh_handle = None
+
+        self._output_search = OutputSearch()
+        self._search_task = None
+        self._matches = []
+        self._match_idx = -1
+        cluster_shell_controller.set_search_handler(self.start_search)
+        cluster_shell_controller.set_message_handler(self.show_message)
 
     def handle_input(self, key):
         self._active_controller.handle_input(key)
@@ -52,26 +71,154 @@ class NodePanelController(BaseController):
 
     def activate(self, **kwargs):
         if not self._activated:
+            self.view.set_node_table(self._root_model.node_table)
             self.view.set_noderows(self._root_model.nodes)
             urwid.connect_signal(
                 self.view.listbox_content, "modified", self.on_node_list_modified
             )
             self._activated = True
+            self._refresh_handle = self._aio_event_loop.call_later(
+                METRICS_REFRESH_INTERVAL, self._refresh_metrics
+            )
         self.switch_to(self._active_controller)
 
+    def _refresh_metrics(self):
+        self._refresh_handle = self._aio_event_loop.call_later(
+            METRICS_REFRESH_INTERVAL, self._refresh_metrics
+        )
+        nodes = self._root_model.nodes
+        table = self._root_model.node_table
+        if table is None or table.count("cmd_state", CommandState.RUNNING):
+            running = [node for node in nodes if node.cmd_state == CommandState.RUNNING]
+            self.view.refresh_rows(running)
+        self.view.refresh_summary(nodes, table)
+        # the rows are patched already, an empty dirty set only redraws
+        if self._repaint_scheduler:
+            self._repaint_scheduler.request(self.repaint_tree)
+        elif self._urwid_loop:
+            self._urwid_loop.draw_screen()
+
+    def quit(self):
+        if self._refresh_handle:
+            self._refresh_handle.cancel()
+            self._refresh_handle = None
+        super().quit()
+
+    def on_cluster_loaded(self):
+        self._cluster_shell_controller.warm_up_connections()
+
     def on_node_list_modified(self):
         node_idx = self.view.get_selected_node_idx()
         self.view.active_right_pane.on_node_list_modified(
             self._root_model.nodes, node_idx
         )
 
-    def repaint(self):
-        self.view.set_noderows(self._root_model.nodes)
+    def repaint(self, dirty_nodes=None):
+        self.view.set_noderows(self._root_model.nodes, dirty_nodes)
+        self.view.set_status_text(self._cluster_shell_controller.status_text())
+
+    def _cycle_metric(self):
+        next_idx = (METRIC_NAMES.index(self.view.metric) + 1) % len(METRIC_NAMES)
+        self.view.set_metric(METRIC_NAMES[next_idx])
+        self.repaint()
+
+    def _dump_metrics(self):
+        picsh_dir = os.path.join(os.path.expanduser("~"), ".picsh")
+        path = os.path.join(picsh_dir, time.strftime("metrics-%Y%m%d-%H%M%S.csv"))
+        try:
+            os.makedirs(picsh_dir, exist_ok=True)
+            dump_metrics(self._root_model.nodes, path)
+            self.view.set_footer_text(f"metrics written to {path}")
+        except OSError as ex:
+            self.view.set_footer_text(f"could not write metrics: {ex}")
+
+    def show_message(self, text: str):
+        self.view.set_footer_text(text)
+        self.repaint_notifer()
+
+    def start_search(self, pattern: str):
+        pattern = pattern.strip()
+        if not pattern:
+            return
+        if self._search_task:
+            self._search_task.cancel()
+        self.view.set_footer_text(f"searching for {pattern} ...")
+        self._search_task = self._aio_event_loop.create_task(self._search(pattern))
+
+    async def _search(self, pattern: str):
+        try:
+            matches = await self._output_search.search(pattern, self._root_model.nodes)
+        except re.error as ex:
+            self.view.set_footer_text(f"bad search pattern: {ex}")
+            self.repaint_notifer()
+            return
+        self._matches = matches
+        self._match_idx = -1
+        if matches:
+            idxs = {node.idx for node, _ in matches}
+            self.view.set_footer_text(
+                f"{pattern}: {len(matches)} matches on {len(idxs)} nodes "
+                f"[{format_node_ranges(idxs)}], Alt N/P to step through them"
+            )
+        else:
+            self.view.set_footer_text(f"{pattern}: no matches")
+        self.repaint_notifer()
+
+    def _jump_to_match(self, step: int):
+        if not self._matches:
+            self.view.set_footer_text("no search results")
+            return
+        if self._match_idx < 0:
+            self._match_idx = 0 if step > 0 else len(self._matches) - 1
+        else:
+            self._match_idx = (self._match_idx + step) % len(self._matches)
+        node, lineno = self._matches[self._match_idx]
+        self.view.select_node(node)
+        if self._active_controller is not self._receive_buffer_controller:
+            self.switch_to(self._receive_buffer_controller)
+            self._active_view_name = ViewNames.BUFFER_VIEW
+        self._receive_buffer_controller.view.show_line(node, lineno)
+        self.view.set_footer_text(
+            f"match {self._match_idx + 1}/{len(self._matches)}: "
+            f"[{node.idx}] {node.get_ip()} line {lineno + 1}"
+        )
+
+    def _handle_prompt_input(self, keys):
+        # pasted or fast typed input comes in one batch with the enter
+        for key in keys:
+            if not self.view.prompt_open():
+                break
+            if key == "enter":
+                self.start_search(self.view.close_prompt())
+            elif key == "esc":
+                self.view.close_prompt()
+                self.view.set_footer_text(self._active_controller.view.footer_text())
+            elif isinstance(key, str):
+                self.view.prompt_keypress(key)
+        return []
 
     def handle_input_filter(self, keys, raw_input):
+        new_view = None
+        if self.view.prompt_open():
+            return self._handle_prompt_input(keys), None
         if "ctrl q" in keys:
             keys = []
             new_view = ViewNames.EXIT_SCREEN
+        elif "meta m" in keys:
+            keys = []
+            self._cycle_metric()
+        elif "meta d" in keys:
+            keys = []
+            self._dump_metrics()
+        elif "meta c" in keys:
+            keys = []
+            self._cluster_shell_controller.reconnect_all()
+        elif "meta n" in keys or "meta p" in keys:
+            self._jump_to_match(1 if "meta n" in keys else -1)
+            keys = []
+        elif "/" in keys and self._active_controller is self._receive_buffer_controller:
+            keys = []
+            self.view.open_prompt("search (re: for a regex): ")
         else:
             keys, new_view = self._active_controller.handle_input_filter(keys, raw_input)
             if new_view == ViewNames.BUFFER_VIEW:
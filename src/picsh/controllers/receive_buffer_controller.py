@@ -27,6 +27,9 @@ class ReceiveBufferController(BaseController):
     def activate(self, node_idx):
         self.view.on_node_list_modified(self._model.nodes, node_idx)
 
+    def repaint(self, dirty_nodes=None):
+        self.view.repaint_buffer(dirty_nodes)
+
     def handle_input_filter(self, keys, raw_input):
         new_view = None
         if "ctrl s" in keys:
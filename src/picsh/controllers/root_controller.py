@@ -11,14 +11,16 @@
 #
 
 import asyncio
+import logging
 import urwid
+from typing import Callable
+from picsh import startup_profile
 from picsh.controllers.base_controller import BaseController
 from picsh.controllers.cluster_selection_controller import ClusterSelectionController
-from picsh.controllers.node_panel_controller import NodePanelController
 from picsh.models.root_model import RootModel
 from picsh.state_change_notifier import StateChangeNotifier
 from picsh.views.view_names import ViewNames
-from picsh.cluster_spec import ObjClusterSpec
+from picsh.repaint_scheduler import RepaintScheduler, DEFAULT_MAX_FPS
 
 
 class RootController(BaseController):
@@ -28,35 +30,57 @@ class RootController(BaseController):
         root_model: RootModel,
         state_change_notifier: StateChangeNotifier,
         cluster_selection_controller: ClusterSelectionController,
-        node_panel_controller: NodePanelController,
+        node_panel_factory: Callable,
+        max_fps: int = DEFAULT_MAX_FPS,
     ):
         self._root_model = root_model
         self._state_change_notifier = state_change_notifier
         self._cluster_selection_controller = cluster_selection_controller
-        self._node_panel_controller = node_panel_controller
+        # node_panel_factory builds the NodePanelController and its children
+        self._node_panel_factory = node_panel_factory
+        self._node_panel_controller = None
 
-        initial_view = (
-            self._cluster_selection_controller.view
-            if self._show_cluster_selection()
-            else self._node_panel_controller.view
-        )
         aio_event_loop = asyncio.get_event_loop()
+        self._aio_event_loop = aio_event_loop
         self._urwid_loop = urwid.MainLoop(
-            initial_view.outer_widget(),
+            self._cluster_selection_controller.view.outer_widget(),
             palette=pallette,
             unhandled_input=self.handle_input,
             input_filter=self._input_filter,
             event_loop=urwid.AsyncioEventLoop(loop=aio_event_loop),
         )
-        self._node_panel_controller.set_urwid_loop(self._urwid_loop)
-        self._node_panel_controller.set_aio_event_loop(aio_event_loop)
+        self._cluster_selection_controller.set_urwid_loop(self._urwid_loop)
+        self._cluster_selection_controller.set_aio_event_loop(aio_event_loop)
+        self._repaint_scheduler = RepaintScheduler(
+            aio_event_loop, self._urwid_loop.draw_screen, max_fps
+        )
 
         if self._show_cluster_selection():
             self.switch_to(self._cluster_selection_controller)
         else:
+            from picsh.cluster_spec import ObjClusterSpec
+
             cluster_spec = ObjClusterSpec(root_model.cluster_spec)
-            self._state_change_notifier.notify({"nodes": cluster_spec.nodes})
-            self.switch_to(self._node_panel_controller)
+            self._state_change_notifier.notify(
+                {
+                    "nodes": cluster_spec.nodes,
+                    "node_table": cluster_spec.node_table,
+                    "fanout": self._root_model.fanout or cluster_spec.fanout,
+                }
+            )
+            self.switch_to(self._node_panel())
+            self._node_panel_controller.on_cluster_loaded()
+
+    def _node_panel(self):
+        if self._node_panel_controller is None:
+            if self._show_cluster_selection():
+                startup_profile.mark("cluster selection screen")
+            controller = self._node_panel_factory()
+            controller.set_urwid_loop(self._urwid_loop)
+            controller.set_aio_event_loop(self._aio_event_loop)
+            controller.set_repaint_scheduler(self._repaint_scheduler)
+            self._node_panel_controller = controller
+        return self._node_panel_controller
 
     def _show_cluster_selection(self):
         return len(self._root_model.cluster_spec_paths) > 0
@@ -71,19 +95,31 @@ class RootController(BaseController):
         return self._active_controller.handle_input(key)
 
     def _input_filter(self, keys, raw_input):
+        # bring pending output on screen before the keystroke is handled;
+        # urwid draws the screen itself once input processing is done
+        self._repaint_scheduler.flush(draw=False)
         new_keys, new_view = self._active_controller.handle_input_filter(
             keys, raw_input
         )
         if new_view == ViewNames.NODE_PANEL_VIEW:
-            self.switch_to(self._node_panel_controller)
+            self.switch_to(self._node_panel())
+            self._node_panel_controller.on_cluster_loaded()
         elif new_view == ViewNames.EXIT_SCREEN:
             self._cluster_selection_controller.quit()
-            self._node_panel_controller.quit()
+            if self._node_panel_controller:
+                self._node_panel_controller.quit()
             raise urwid.ExitMainLoop()
         return new_keys
 
+    def _first_frame(self):
+        if startup_profile.enabled():
+            self._urwid_loop.draw_screen()
+            startup_profile.mark("first frame")
+
     def run(self):
+        self._aio_event_loop.call_soon(self._first_frame)
         try:
             self._urwid_loop.run()
         except KeyboardInterrupt:
             pass
+        logging.info(f"repaint stats: {self._repaint_scheduler.stats()}")
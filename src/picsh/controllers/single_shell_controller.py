@@ -38,12 +38,20 @@ class SingleShellController(BaseController):
 
     def activate(self, node_idx):
         node = next(filter(lambda x: x.idx == node_idx, self._model.nodes), None)
-        self.view.switch_to_terminal(node, self._urwid_loop)
+        self.view.switch_to_terminal(node, self._urwid_loop, self._on_terminal_output)
         # urwid.connect_signal(
         #     self.view._terminals[node.idx].terminal_widget,
         #     "closed",
         #     functools.partial(self._switch_to, node),
         # )
 
+    def _on_terminal_output(self):
+        # the terminal widget is redrawn with the next frame
+        if self._repaint_scheduler:
+            self._repaint_scheduler.request(self.repaint)
+
+    def quit(self):
+        self.view.close_terminals()
+
     def want_focus(self):
         return True
@@ -0,0 +1,89 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" bounded concurrency for fanning work out to many nodes """
+
+import asyncio
+from collections import deque
+
+DEFAULT_FANOUT = 64
+
+
+class FanoutWindow:
+    # At most `size` holders at a time (size <= 0 means no limit). Waiters are
+    # admitted strictly in arrival order, and a released slot is handed
+    # straight to the oldest waiter so late arrivals cannot jump the queue.
+
+    def __init__(self, size: int = DEFAULT_FANOUT):
+        self.size = size
+        self.in_flight = 0
+        self.completed = 0
+        self._waiters = deque()
+
+    @property
+    def queued(self):
+        return len(self._waiters)
+
+    def resize(self, size: int):
+        self.size = size
+        while self._waiters and self._has_room():
+            self._admit_next()
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "completed": self.completed,
+        }
+
+    async def acquire(self):
+        if not self._waiters and self._has_room():
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_event_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just as we were cancelled
+                self._release_slot()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self):
+        self.completed += 1
+        self._release_slot()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def _has_room(self):
+        return self.size <= 0 or self.in_flight < self.size
+
+    def _admit_next(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self.in_flight += 1
+                return
+
+    def _release_slot(self):
+        self.in_flight -= 1
+        if self._has_room():
+            self._admit_next()
@@ -0,0 +1,414 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" file transfers to and from many nodes over their sftp subsystems """
+
+import asyncio
+import logging
+import mmap
+import os
+import posixpath
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import asyncssh
+
+from picsh.fanout_window import FanoutWindow
+from picsh.node import SSHTargetNode
+
+# nodes transferring at the same time
+DEFAULT_TRANSFER_FANOUT = 16
+CHUNK_BYTES = 256 * 1024
+# sftp reads or writes in flight per file
+MAX_REQUESTS = 16
+# pulled data is closed off into a complete gzip member, a point a later pull
+# can resume from, after this many bytes
+CHECKPOINT_BYTES = 8 * 1024 * 1024
+
+
+class TransferProgress:
+    def __init__(self, kind: str, total_bytes: int):
+        self.kind = kind
+        self.total_bytes = total_bytes
+        self.done_bytes = 0
+        self.start_time: Optional[float] = None
+        self.end_time: Optional[float] = None
+        self.error: Optional[Exception] = None
+
+    @property
+    def started(self):
+        return self.start_time is not None
+
+    @property
+    def finished(self):
+        return self.end_time is not None
+
+    def start(self):
+        self.start_time = time.monotonic()
+
+    def finish(self, error: Optional[Exception] = None):
+        self.end_time = time.monotonic()
+        self.error = error
+
+    def elapsed(self) -> Optional[float]:
+        if self.start_time is None:
+            return None
+        return (self.end_time or time.monotonic()) - self.start_time
+
+    def fraction(self) -> float:
+        if not self.total_bytes:
+            return 1.0 if self.finished else 0.0
+        return self.done_bytes / self.total_bytes
+
+    def rate(self) -> Optional[float]:
+        elapsed = self.elapsed()
+        if not elapsed:
+            return None
+        return self.done_bytes / elapsed
+
+
+class RateLimiter:
+    # Token bucket shared by all the transfers it is passed to, rate in
+    # bytes/sec, 0 for no limit. Up to one second worth of bytes can burst.
+
+    def __init__(self, rate: float = 0):
+        self.rate = rate
+        self._tokens = rate
+        self._last = None
+
+    async def consume(self, nbytes: int):
+        if self.rate <= 0:
+            return
+        now = asyncio.get_event_loop().time()
+        if self._last is not None:
+            self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+        self._tokens -= nbytes
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+
+
+class _LocalSource:
+    # The file or directory tree being pushed. Each file is mapped once and
+    # the same pages are sent to every node.
+
+    def __init__(self, path: str):
+        path = os.path.abspath(path)
+        self.name = os.path.basename(path.rstrip(os.sep))
+        self.dirs: List[str] = []
+        # (relative path, mode, data)
+        self.files: List[Tuple[str, int, memoryview]] = []
+        self._maps: List[mmap.mmap] = []
+        if os.path.isdir(path):
+            self.dirs.append(self.name)
+            for dirpath, dirnames, filenames in os.walk(path):
+                rel_dir = os.path.relpath(dirpath, os.path.dirname(path))
+                self.dirs.extend(os.path.join(rel_dir, d) for d in sorted(dirnames))
+                for filename in sorted(filenames):
+                    self._add_file(os.path.join(dirpath, filename), os.path.join(rel_dir, filename))
+        else:
+            self._add_file(path, self.name)
+        self.total_bytes = sum(len(data) for _, _, data in self.files)
+
+    def _add_file(self, path: str, rel_path: str):
+        with open(path, "rb") as fh:
+            st = os.fstat(fh.fileno())
+            if st.st_size:
+                mapped = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps.append(mapped)
+                data = memoryview(mapped)
+            else:
+                data = memoryview(b"")
+        self.files.append((rel_path.replace(os.sep, "/"), st.st_mode & 0o777, data))
+
+    def close(self):
+        for _, _, data in self.files:
+            data.release()
+        self.files = []
+        for mapped in self._maps:
+            try:
+                mapped.close()
+            except BufferError:
+                # a view of it is still alive somewhere; the pages are
+                # unmapped once that view goes
+                logging.debug("push source: mapped file still in use")
+        self._maps = []
+
+
+async def _write_pipelined(
+    fh, data: memoryview, on_chunk: Callable[[int], None], limiter: Optional[RateLimiter]
+):
+    # up to MAX_REQUESTS writes in flight, so throughput is not capped at one
+    # chunk per round trip
+    pending = set()
+    try:
+        for offset in range(0, len(data), CHUNK_BYTES):
+            if len(pending) >= MAX_REQUESTS:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    on_chunk(task.result())
+            pending.add(asyncio.ensure_future(_write_chunk(fh, data, offset, limiter)))
+        for task in asyncio.as_completed(pending):
+            on_chunk(await task)
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            # let the cancelled writes release their views of the file
+            await asyncio.wait(pending)
+
+
+async def _write_chunk(fh, data: memoryview, offset: int, limiter: Optional[RateLimiter]) -> int:
+    # a view into the mapped file, copied only into the sftp packet; it is
+    # released however the write ends so the map can be closed
+    with data[offset : offset + CHUNK_BYTES] as chunk:
+        if limiter:
+            await limiter.consume(len(chunk))
+        await fh.write(chunk, offset)
+        return len(chunk)
+
+
+async def _push_to_node(
+    node: SSHTargetNode,
+    source: _LocalSource,
+    remote_dir: str,
+    window: FanoutWindow,
+    limiter: Optional[RateLimiter],
+    notify: Callable,
+    connect_window: Optional[FanoutWindow],
+):
+    progress = TransferProgress("push", source.total_bytes)
+    node.transfer = progress
+    notify(node)
+
+    def on_chunk(nbytes):
+        progress.done_bytes += nbytes
+        notify(node)
+
+    async with window:
+        progress.start()
+        notify(node)
+        try:
+            sftp = await node.sftp_client(connect_window)
+            for rel_dir in source.dirs:
+                remote_path = posixpath.join(remote_dir, rel_dir.replace(os.sep, "/"))
+                try:
+                    await sftp.mkdir(remote_path)
+                except asyncssh.SFTPFailure:
+                    if not await sftp.isdir(remote_path):
+                        raise
+            for rel_path, mode, data in source.files:
+                remote_path = posixpath.join(remote_dir, rel_path)
+                async with sftp.open(remote_path, "wb") as fh:
+                    await _write_pipelined(fh, data, on_chunk, limiter)
+                await sftp.chmod(remote_path, mode)
+        except (OSError, asyncssh.Error) as ex:
+            logging.info(f"push to {node.get_ip()}: {ex}")
+            node.recv_buf.append(f"\npicsh: push failed: {ex}")
+            # without the traceback, which holds the frames of the write
+            progress.finish(ex.with_traceback(None))
+        else:
+            progress.finish()
+        notify(node)
+
+
+async def push(
+    nodes: List[SSHTargetNode],
+    local_path: str,
+    remote_dir: str,
+    window: FanoutWindow,
+    notify: Callable,
+    limiter: Optional[RateLimiter] = None,
+    connect_window: Optional[FanoutWindow] = None,
+) -> Dict[SSHTargetNode, TransferProgress]:
+    # raises OSError if the local file cannot be read; failures on a node
+    # are recorded in its TransferProgress
+    source = _LocalSource(local_path)
+    try:
+        await asyncio.gather(
+            *(
+                _push_to_node(node, source, remote_dir, window, limiter, notify, connect_window)
+                for node in nodes
+            )
+        )
+    finally:
+        source.close()
+    return {node: node.transfer for node in nodes}
+
+
+class _GzipSink:
+    # The gzip compressed local copy of a remote file. It is written as a
+    # series of gzip members (gunzip reads them as one stream); after each
+    # member the remote offset and local size reached are saved next to it,
+    # and a later pull truncates to that point and carries on from there.
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offset_path = path + ".offset"
+        self._fh = None
+        self._compressor = None
+        self._member_bytes = 0
+        self._remote_offset = 0
+
+    def resume_offset(self, remote_size: int) -> int:
+        # the remote offset to pull from, 0 to start over
+        try:
+            with open(self._offset_path) as fh:
+                remote_offset, local_size = (int(v) for v in fh.read().split())
+            if remote_offset <= remote_size and os.path.getsize(self.path) >= local_size:
+                os.truncate(self.path, local_size)
+                return remote_offset
+        except (OSError, ValueError):
+            pass
+        return 0
+
+    def open(self, remote_offset: int):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._fh = open(self.path, "ab" if remote_offset else "wb")
+        self._remote_offset = remote_offset
+        self._new_member()
+
+    def write(self, data: bytes):
+        self._fh.write(self._compressor.compress(data))
+        self._remote_offset += len(data)
+        self._member_bytes += len(data)
+        if self._member_bytes >= CHECKPOINT_BYTES:
+            self._checkpoint()
+
+    def close(self):
+        self._checkpoint()
+        self._fh.close()
+
+    def _new_member(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        self._member_bytes = 0
+
+    def _checkpoint(self):
+        # an empty file still gets one (empty) member so it is valid gzip
+        if self._member_bytes or not self._fh.tell():
+            self._fh.write(self._compressor.flush())
+            self._fh.flush()
+        tmp_path = self._offset_path + ".tmp"
+        with open(tmp_path, "w") as fh:
+            fh.write(f"{self._remote_offset} {self._fh.tell()}\n")
+        os.replace(tmp_path, self._offset_path)
+        self._new_member()
+
+
+async def _read_pipelined(fh, offset: int, size: int, on_data: Callable):
+    # reads are issued MAX_REQUESTS ahead but handed over in file order, so
+    # at most MAX_REQUESTS chunks are held in memory
+    pending = deque()
+    next_offset = offset
+    try:
+        while pending or next_offset < size:
+            while next_offset < size and len(pending) < MAX_REQUESTS:
+                pending.append(asyncio.ensure_future(fh.read(CHUNK_BYTES, next_offset)))
+                next_offset += CHUNK_BYTES
+            data = await pending.popleft()
+            if not data:
+                break
+            await on_data(data)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _pull_file(sftp, remote_path, size, sink, offset, on_data, executor):
+    sink.open(offset)
+    try:
+        async with sftp.open(remote_path, "rb") as fh:
+            await _read_pipelined(fh, offset, size, lambda data: on_data(sink, data))
+    finally:
+        # queued behind any write still running when the pull is cancelled
+        await asyncio.get_event_loop().run_in_executor(executor, sink.close)
+
+
+def _local_rel_path(remote_path: str) -> str:
+    # where under the node's directory a remote file goes; never outside it
+    parts = posixpath.normpath(remote_path).split("/")
+    return os.path.join(*[p if p != ".." else "__" for p in parts if p])
+
+
+async def _pull_from_node(
+    node: SSHTargetNode,
+    pattern: str,
+    local_dir: str,
+    window: FanoutWindow,
+    limiter: Optional[RateLimiter],
+    notify: Callable,
+    connect_window: Optional[FanoutWindow],
+):
+    progress = TransferProgress("pull", 0)
+    node.transfer = progress
+    notify(node)
+    loop = asyncio.get_event_loop()
+    node_dir = os.path.join(local_dir, f"{node.idx}-{node.get_ip()}")
+    # Compression and disk writes run off the event loop, on one thread per
+    # node so a sink is never written and closed at the same time.
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="picsh-pull")
+
+    async def on_data(sink, data):
+        if limiter:
+            await limiter.consume(len(data))
+        await loop.run_in_executor(executor, sink.write, data)
+        progress.done_bytes += len(data)
+        notify(node)
+
+    async with window:
+        progress.start()
+        notify(node)
+        try:
+            sftp = await node.sftp_client(connect_window)
+            plan = []
+            for name in await sftp.glob_sftpname(pattern):
+                if name.attrs.type != asyncssh.FILEXFER_TYPE_REGULAR:
+                    continue
+                sink = _GzipSink(os.path.join(node_dir, _local_rel_path(name.filename)) + ".gz")
+                offset = sink.resume_offset(name.attrs.size)
+                plan.append((name.filename, name.attrs.size, sink, offset))
+                progress.total_bytes += name.attrs.size - offset
+            for remote_path, size, sink, offset in plan:
+                await _pull_file(sftp, remote_path, size, sink, offset, on_data, executor)
+        except (OSError, asyncssh.Error) as ex:
+            logging.info(f"pull from {node.get_ip()}: {ex}")
+            node.recv_buf.append(f"\npicsh: pull failed: {ex}")
+            progress.finish(ex)
+        else:
+            progress.finish()
+        finally:
+            executor.shutdown(wait=False)
+        notify(node)
+
+
+async def pull(
+    nodes: List[SSHTargetNode],
+    pattern: str,
+    local_dir: str,
+    window: FanoutWindow,
+    notify: Callable,
+    limiter: Optional[RateLimiter] = None,
+    connect_window: Optional[FanoutWindow] = None,
+) -> Dict[SSHTargetNode, TransferProgress]:
+    # files matching the remote glob pattern go to local_dir/<idx>-<ip>/<path>.gz
+    await asyncio.gather(
+        *(
+            _pull_from_node(node, pattern, local_dir, window, limiter, notify, connect_window)
+            for node in nodes
+        )
+    )
+    return {node: node.transfer for node in nodes}
@@ -0,0 +1,95 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" bastion hosts that node connections are tunneled through """
+
+import asyncio
+import asyncssh
+from typing import List, Optional, Tuple
+from picsh.exceptions.picsh_exception import PicshException
+from picsh.node import DEFAULT_KEEPALIVE_INTERVAL, KEEPALIVE_COUNT_MAX
+
+# ssh connections to one bastion that its nodes are spread over
+DEFAULT_JUMP_CONNECTIONS = 1
+
+
+def parse_jump_host(spec: str) -> Tuple[Optional[str], str, int]:
+    # "[user@]host[:port]", like ssh -J
+    user, _, hostport = str(spec).rpartition("@")
+    host, port = hostport, 22
+    if hostport.count(":") == 1:
+        host, port_str = hostport.split(":")
+        try:
+            port = int(port_str)
+        except ValueError:
+            raise PicshException(f"bad port in jump host [{spec}].")
+    if not host:
+        raise PicshException(f"bad jump host [{spec}].")
+    return user or None, host, port
+
+
+class JumpHost:
+    # One login to the bastion serves many nodes: each node connection is a
+    # tunnel (a direct-tcpip channel) over one of up to `connections` ssh
+    # connections to it, handed out round robin. Connections are opened on
+    # first use and reopened by the next node that needs one after they close.
+
+    def __init__(
+        self,
+        spec: str,
+        login_user: Optional[str],
+        ssh_key_path: Optional[str],
+        connections: int = DEFAULT_JUMP_CONNECTIONS,
+        keepalive_interval: float = DEFAULT_KEEPALIVE_INTERVAL,
+    ):
+        user, self.host, self.port = parse_jump_host(spec)
+        self.login_user = user or login_user
+        self.ssh_key_path = ssh_key_path
+        self.keepalive_interval = keepalive_interval
+        self._conns: List[Optional[asyncio.Future]] = [None] * max(1, connections)
+        self._next = 0
+
+    def __str__(self):
+        return f"{self.host}:{self.port}"
+
+    async def connection(self) -> asyncssh.SSHClientConnection:
+        slot = self._next % len(self._conns)
+        self._next += 1
+        conn = self._conns[slot]
+        if conn is not None and conn.done():
+            if conn.cancelled() or conn.exception() or conn.result().is_closed():
+                conn = None
+        if conn is None:
+            # concurrent callers share the attempt; a failed one is retried
+            # by the next caller
+            conn = asyncio.ensure_future(self._connect())
+            self._conns[slot] = conn
+        return await asyncio.shield(conn)
+
+    async def _connect(self):
+        return await asyncssh.connect(
+            self.host,
+            self.port,
+            known_hosts=None,
+            options=asyncssh.SSHClientConnectionOptions(
+                client_keys=self.ssh_key_path or (),
+                username=self.login_user or (),
+                keepalive_interval=self.keepalive_interval,
+                keepalive_count_max=KEEPALIVE_COUNT_MAX,
+            ),
+        )
+
+    def close(self):
+        for conn in self._conns:
+            if conn is not None and conn.done() and not conn.cancelled() and not conn.exception():
+                conn.result().close()
+        self._conns = [None] * len(self._conns)
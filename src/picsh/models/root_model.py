@@ -10,8 +10,11 @@
 # FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
 #
 
-from picsh.node import SSHTargetNode
-from typing import List, Mapping, Dict, Any, MutableMapping
+from typing import List, Mapping, Dict, Any, MutableMapping, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from picsh.node import SSHTargetNode
+    from picsh.node_table import NodeTable
 
 # store all application state in one place a la Flux
 # https://youtu.be/nYkdrAPrdcw?t=635
@@ -19,11 +22,19 @@ from typing import List, Mapping, Dict, Any, MutableMapping
 
 
 class RootModel:
-    def __init__(self, nodes=None, cluster_spec_paths=None, cluster_spec=None, node_selection_filter=""):
-        self.nodes: List[SSHTargetNode] = nodes or []
+    def __init__(self, nodes=None, cluster_spec_paths=None, cluster_spec=None, node_selection_filter="", fanout=0, record_dir="", transfer_rate=0):
+        self.nodes: List["SSHTargetNode"] = nodes or []
+        # the loaded cluster's NodeTable, its rows are nodes in order
+        self.node_table: Optional["NodeTable"] = None
         self.cluster_spec_paths: List[str] = cluster_spec_paths or []
         self.cluster_spec = cluster_spec or {}
         self.node_selection_filter: str = node_selection_filter
+        # max concurrent handshakes / commands, 0 until set from args or spec
+        self.fanout: int = fanout
+        # record node output under this directory, "" to not record
+        self.record_dir: str = record_dir
+        # total bytes/sec for :push and :pull, 0 for no limit
+        self.transfer_rate: int = transfer_rate
 
     def __setattr__(self, __name: str, __value: Any) -> None:
         if __name in self.__dict__:
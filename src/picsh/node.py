@@ -13,19 +13,119 @@
 import warnings
 
 warnings.filterwarnings("ignore", module="asyncssh\.crypto.*")
-from typing import Optional
+import asyncio
+import re
+import time
+from enum import Enum
+from typing import FrozenSet, Optional
 import asyncssh
+from picsh.output_buffer import OutputBuffer
+from picsh.node_table import (
+    NodeTable,
+    EnumColumn,
+    FlagColumn,
+    FloatColumn,
+    OptionalFloatColumn,
+    OptionalIntColumn,
+)
+
+
+# Every command is followed by an echo of this marker with a sequence number and
+# the command's exit status. The marker line is stripped from the output.
+CMD_DONE_MARKER = "B79D8677-F58A-4E09-B917-855A6619A951"
+_CMD_DONE_RE = re.compile(CMD_DONE_MARKER + r":(\d+):(\d+)\r?\n")
+
+# seconds between ssh keepalives; a connection is dropped after
+# KEEPALIVE_COUNT_MAX of them go unanswered
+DEFAULT_KEEPALIVE_INTERVAL = 15
+KEEPALIVE_COUNT_MAX = 3
+
+_NO_TAGS: FrozenSet[str] = frozenset()
+
+
+def _partial_marker_len(data: str) -> int:
+    # length of the longest suffix of data that could begin a marker
+    for length in range(min(len(CMD_DONE_MARKER) - 1, len(data)), 0, -1):
+        if data.endswith(CMD_DONE_MARKER[:length]):
+            return length
+    return 0
+
+
+class _HandshakeTimer(asyncssh.SSHClient):
+    # records when the transport came up and when auth completed
+    def __init__(self, node: "SSHTargetNode", start_time: float):
+        self._node = node
+        self._start_time = start_time
+        self._connected_time = start_time
+
+    def connection_made(self, conn: asyncssh.SSHClientConnection) -> None:
+        self._connected_time = time.monotonic()
+        self._node.connect_time = self._connected_time - self._start_time
+
+    def auth_completed(self) -> None:
+        self._node.auth_time = time.monotonic() - self._connected_time
+
+
+class CommandState(Enum):
+    IDLE = 0
+    RUNNING = 1
+    FINISHED = 2
+
+
+class ConnectionState(Enum):
+    DISCONNECTED = 0
+    QUEUED = 1
+    CONNECTING = 2
+    CONNECTED = 3
+    FAILED = 4
 
 
 class SSHTargetNode(asyncssh.SSHClientSession):
-    def __init__(self):
-        self.recv_buf = ""
-        self.hide = False
+    # state that views scan across the whole cluster lives in a NodeTable row
+    conn_state = EnumColumn(ConnectionState)
+    cmd_state = EnumColumn(CommandState)
+    hide = FlagColumn()
+    exit_status = OptionalIntColumn()
+    connect_latency = OptionalFloatColumn()
+    connect_time = OptionalFloatColumn()
+    auth_time = OptionalFloatColumn()
+    first_byte_latency = OptionalFloatColumn()
+    cmd_duration = OptionalFloatColumn()
+    cmd_start_time = FloatColumn()
+
+    def __init__(
+        self,
+        table: Optional[NodeTable] = None,
+        row: Optional[int] = None,
+        recv_buf: Optional[OutputBuffer] = None,
+    ):
+        # a node built on its own gets a table of its own
+        self.table = NodeTable() if table is None else table
+        self.row = self.table.add_row() if row is None else row
+        # an empty OutputBuffer is falsy
+        self.recv_buf = OutputBuffer() if recv_buf is None else recv_buf
         self._is_connected = False
         self._conn = None
-        self._session_factory = None
         self._chan = None
+        self._sftp = None
         self._notify = None
+        self._recorder = None
+        self._connect_task = None
+        self._reconnector = None
+        self._connected_once = False
+        self._disconnecting = False
+        self.keepalive_interval = DEFAULT_KEEPALIVE_INTERVAL
+        self._cmd_seq = 0
+        self._cmd_done: Optional[asyncio.Event] = None
+        self._held_output = ""
+        # progress of the last file transfer, a file_transfer.TransferProgress
+        self.transfer = None
+        # the node whose connection this one is tunneled through, if any
+        self.relay: Optional["SSHTargetNode"] = None
+        # the bastion this node (or its relay) is reached through, a
+        # jump_hosts.JumpHost shared with other nodes and closed by the
+        # ClusterSpec that made it
+        self.jump_host = None
 
     def session_factory(self):
         return self
@@ -33,36 +133,235 @@ class SSHTargetNode(asyncssh.SSHClientSession):
     def register_notify(self, notify_func):
         self._notify = notify_func
 
-    async def do_connect(self):
-        self.recv_buf = f"connecting {self.get_login_user()}@{self.get_ip()} ..."
-        self._notify()
+    def register_recorder(self, recorder):
+        # recorder: a SessionRecorder that gets this node's output
+        self._recorder = recorder
+
+    def register_reconnector(self, reconnector):
+        # reconnector: a reconnect.Reconnector, told when the connection drops
+        self._reconnector = reconnector
+
+    def show_message(self, text: str):
+        self.recv_buf.append(f"\npicsh: {text}")
+        self._notify_changed()
+
+    def _notify_changed(self):
+        if self._notify:
+            self._notify(self)
+
+    async def ensure_connected(self, connect_window=None):
+        # a warm-up connect and a command can race, they share one attempt
+        # connect_window (a FanoutWindow) bounds concurrent handshakes
+        if self._is_connected:
+            return
+        if self._connect_task is None:
+            self._connect_task = asyncio.ensure_future(
+                self._windowed_connect(connect_window)
+            )
+        try:
+            await asyncio.shield(self._connect_task)
+        finally:
+            if self._connect_task and self._connect_task.done():
+                self._connect_task = None
+
+    async def _windowed_connect(self, connect_window):
+        # the relay connects first, so that nodes waiting for it do not hold
+        # connect window slots it needs
+        try:
+            tunnel = await self._tunnel(connect_window)
+        except Exception:
+            self.conn_state = ConnectionState.FAILED
+            raise
+        if connect_window is None:
+            await self.do_connect(tunnel)
+            return
+        self.conn_state = ConnectionState.QUEUED
+        self._notify_changed()
+        async with connect_window:
+            await self.do_connect(tunnel)
+
+    async def warm_up(self, connect_window=None):
+        try:
+            await self.ensure_connected(connect_window)
+        except Exception as ex:
+            self.recv_buf.replace("picsh: exception encountered: " + str(ex))
+            self._notify_changed()
+
+    async def do_connect(self, tunnel=None):
+        self.conn_state = ConnectionState.CONNECTING
+        if self._connected_once:
+            # keep the output from before the connection dropped
+            self.recv_buf.append("\npicsh: reconnecting ...")
+        else:
+            self.recv_buf.replace(f"connecting {self.get_login_user()}@{self.get_ip()} ...")
+        self._notify_changed()
+        start_time = time.monotonic()
+        try:
+            await self._open_session(start_time, tunnel)
+        except Exception:
+            self.conn_state = ConnectionState.FAILED
+            raise
+        self.connect_latency = time.monotonic() - start_time
+        self._is_connected = True
+        self._disconnecting = False
+        if self._connected_once:
+            self.recv_buf.append(" reconnected\n")
+            self.conn_state = ConnectionState.CONNECTED
+            self._notify_changed()
+            return
+        self._connected_once = True
+        self.recv_buf.append("\n...connected")
+        self._notify_changed()
+        self.recv_buf.clear()
+        # connected only once the connect chatter is out of the buffer
+        self.conn_state = ConnectionState.CONNECTED
+        self._notify_changed()
+
+    async def _tunnel(self, connect_window=None):
+        # the connection to reach this node through, None to connect directly
+        if self.relay is None:
+            return await self._jump_host_tunnel()
+        try:
+            await self.relay.ensure_connected(connect_window)
+        except Exception as ex:
+            raise ConnectionError(f"relay {self.relay.get_ip()}: {ex}") from ex
+        return self.relay._conn
+
+    async def _jump_host_tunnel(self):
+        if self.jump_host is None:
+            return None
+        try:
+            return await self.jump_host.connection()
+        except Exception as ex:
+            raise ConnectionError(f"jump host {self.jump_host}: {ex}") from ex
+
+    async def _open_session(self, start_time, tunnel=None):
         self._conn = await asyncssh.connect(
             self.get_ip(),
+            self.get_port(),
+            tunnel=tunnel or (),
             known_hosts=None,
+            client_factory=lambda: _HandshakeTimer(self, start_time),
             options=asyncssh.SSHClientConnectionOptions(
                 client_keys=self.get_ssh_key_path(),
                 username=self.get_login_user(),
                 password=self.get_password(),
+                keepalive_interval=self.keepalive_interval,
+                keepalive_count_max=KEEPALIVE_COUNT_MAX,
             ),
         )
         self._chan, sess = await self._conn.create_session(self.session_factory)
-        self.recv_buf += "\n...connected"
-        self._notify()
-        self.recv_buf = ""
 
-    async def run_cmd(self, cmd):
+    async def open_pty_session(self, session_factory, width, height):
+        # an interactive shell on a channel of its own on this node's
+        # connection; no new handshake once the node is connected
+        await self.ensure_connected()
+        chan, _ = await self._conn.create_session(
+            session_factory,
+            # what urwid.Terminal emulates
+            term_type="linux",
+            term_size=(width, height),
+            encoding=None,
+        )
+        return chan
+
+    async def sftp_client(self, connect_window=None):
+        # one sftp session per connection, shared by pushes and pulls
+        await self.ensure_connected(connect_window)
+        if self._sftp is None:
+            self._sftp = await self._conn.start_sftp_client()
+        return self._sftp
+
+    def disconnect(self):
+        self._disconnecting = True
+        if self._conn:
+            self._conn.close()
+
+    async def run_cmd(self, cmd, connect_window=None):
+        self._cmd_seq += 1
+        self.cmd_state = CommandState.RUNNING
+        self.exit_status = None
+        self.cmd_duration = None
+        self.first_byte_latency = None
+        self.cmd_start_time = time.monotonic()
+        # whoever waits on the command this one supersedes is done waiting
+        if self._cmd_done:
+            self._cmd_done.set()
+        self._cmd_done = asyncio.Event()
+        if self.transfer and self.transfer.finished:
+            self.transfer = None
         try:
-            if not self._is_connected:
-                await self.do_connect()
-                self._is_connected = True
-            self._chan.write(cmd + "\n")
+            await self.ensure_connected(connect_window)
+            if self._recorder:
+                self._recorder.command_started(self, cmd)
+            self._chan.write(
+                cmd + "\n" + f'echo "{CMD_DONE_MARKER}:{self._cmd_seq}:$?"\n'
+            )
 
         except Exception as ex:
-            self.recv_buf = "picsh: exception encountered: " + str(ex)
-            self._notify()
+            self.recv_buf.replace("picsh: exception encountered: " + str(ex))
+            self._finish_cmd(None)
+            self._notify_changed()
+
+    async def wait_cmd_done(self):
+        if self.cmd_state == CommandState.RUNNING and self._cmd_done:
+            await self._cmd_done.wait()
+
+    def cmd_elapsed(self) -> Optional[float]:
+        if self.cmd_state == CommandState.RUNNING:
+            return time.monotonic() - self.cmd_start_time
+        return self.cmd_duration
+
+    def _finish_cmd(self, exit_status: Optional[int]):
+        self.cmd_state = CommandState.FINISHED
+        self.exit_status = exit_status
+        self.cmd_duration = time.monotonic() - self.cmd_start_time
+        if self._cmd_done:
+            self._cmd_done.set()
+        if self._recorder:
+            self._recorder.command_finished(self)
+
+    def _strip_done_markers(self, data: str):
+        # returns the displayable part of data and the exit status if the
+        # current command finished; a marker line that is split across reads
+        # is held back until the rest of it arrives
+        out = []
+        pos = 0
+        exit_status = None
+        while True:
+            idx = data.find(CMD_DONE_MARKER, pos)
+            if idx == -1:
+                break
+            match = _CMD_DONE_RE.match(data, idx)
+            if match:
+                out.append(data[pos:idx])
+                pos = match.end()
+                if int(match.group(1)) == self._cmd_seq:
+                    exit_status = int(match.group(2))
+            elif "\n" in data[idx:]:
+                # not one of ours after all
+                out.append(data[pos : idx + len(CMD_DONE_MARKER)])
+                pos = idx + len(CMD_DONE_MARKER)
+            else:
+                out.append(data[pos:idx])
+                self._held_output = data[idx:]
+                return "".join(out), exit_status
+        rest = data[pos:]
+        held = _partial_marker_len(rest)
+        self._held_output = rest[len(rest) - held :]
+        out.append(rest[: len(rest) - held])
+        return "".join(out), exit_status
 
     def data_received(self, data: str, datatype: asyncssh.DataType) -> None:
-        self.recv_buf += data
+        received_time = time.monotonic()
+        data, exit_status = self._strip_done_markers(self._held_output + data)
+        if self._recorder:
+            self._recorder.record(self, data)
+        if data and self.first_byte_latency is None and self._cmd_seq:
+            self.first_byte_latency = received_time - self.cmd_start_time
+        self.recv_buf.append(data)
+        if exit_status is not None:
+            self._finish_cmd(exit_status)
         # if not self._login_guid_found:
         #     # surpress login banner.
         #     # Note: RFC-4254 reccomends the use of magic cookeis to surpress spurious
@@ -74,19 +373,35 @@ class SSHTargetNode(asyncssh.SSHClientSession):
         #         self._login_guid_found = True
         #         guid_len = len(InteractiveClientSession.login_complete_guid)
         #         self._node.recv_buf = self._node.recv_buf[pos1 + guid_len + 1:]
-        if self.recv_buf:
-            self._notify()
+        # notify even if only a marker arrived, the command state changed
+        self._notify_changed()
 
     def connection_lost(self, exc: Optional[Exception]) -> None:
+        # the shell session is gone; the whole connection goes with it so the
+        # next command starts over with a fresh one
+        self._sftp = None
+        self._chan = None
+        self._is_connected = False
+        conn, self._conn = self._conn, None
+        if conn:
+            conn.close()
+        self.conn_state = ConnectionState.DISCONNECTED
         err_str = "\npicsh: Connection lost. "
         if exc:
             err_str += "SSH session error: " + str(exc)
-        self.recv_buf += err_str
-        self._notify()
+        self.recv_buf.append(err_str)
+        if self.cmd_state == CommandState.RUNNING:
+            self._finish_cmd(None)
+        self._notify_changed()
+        if self._reconnector and not self._disconnecting:
+            self._reconnector.schedule(self)
 
     def get_ip(self):
         raise NotImplementedError()
 
+    def get_port(self):
+        raise NotImplementedError()
+
     def get_login_user(self):
         raise NotImplementedError()
 
@@ -98,18 +413,28 @@ class SSHTargetNode(asyncssh.SSHClientSession):
 
 
 class Node(SSHTargetNode):
-    def __init__(self):
-        super().__init__()
+    def __init__(
+        self,
+        table: Optional[NodeTable] = None,
+        row: Optional[int] = None,
+        recv_buf: Optional[OutputBuffer] = None,
+    ):
+        super().__init__(table, row, recv_buf)
         self.ip_addr = ""
+        self.port = 22
         self.login_user = ""
         self.password = ""
         self.ssh_key_path = ""
         self.name = ""
+        self.tags: FrozenSet[str] = _NO_TAGS
         self.idx = -1
 
     def get_ip(self):
         return self.ip_addr
 
+    def get_port(self):
+        return self.port
+
     def get_login_user(self):
         return self.login_user
 
@@ -0,0 +1,114 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" per-node latency and throughput metrics """
+
+import csv
+import math
+from typing import Callable, Dict, List, Optional, Sequence
+from picsh.node import SSHTargetNode
+from picsh.node_table import NodeTable
+
+
+def _bytes_per_sec(node: SSHTargetNode) -> Optional[float]:
+    elapsed = node.cmd_elapsed()
+    if not elapsed:
+        return None
+    return node.recv_buf.bytes_received / elapsed
+
+
+# metric name => value for a node, None if not measured (yet)
+METRICS: Dict[str, Callable[[SSHTargetNode], Optional[float]]] = {
+    "bytes": lambda node: node.recv_buf.bytes_received,
+    "connect": lambda node: node.connect_time,
+    "auth": lambda node: node.auth_time,
+    "ttfb": lambda node: node.first_byte_latency,
+    "duration": lambda node: node.cmd_elapsed(),
+    "rate": _bytes_per_sec,
+    "xfer": lambda node: node.transfer.rate() if node.transfer else None,
+}
+
+METRIC_NAMES = list(METRICS)
+
+# metrics that are a NodeTable column, summarized straight from the column
+_COLUMN_METRICS = {
+    "connect": "connect_time",
+    "auth": "auth_time",
+    "ttfb": "first_byte_latency",
+}
+
+
+def format_metric(name: str, value: Optional[float]) -> str:
+    if value is None:
+        return "-"
+    if name == "bytes":
+        return str(value)
+    if name in ("rate", "xfer"):
+        for unit in ("", "K", "M", "G"):
+            if value < 1024 or unit == "G":
+                return f"{value:.0f}{unit}/s"
+            value /= 1024
+    return f"{value:.2f}s"
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    # nearest-rank percentile of an already sorted sequence
+    rank = max(math.ceil(pct / 100.0 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def _values(
+    name: str, nodes: List[SSHTargetNode], table: Optional[NodeTable]
+) -> List[float]:
+    # table: the NodeTable whose rows are exactly nodes, if there is one
+    if table and name in _COLUMN_METRICS:
+        # nan is a node without a value
+        return [v for v in getattr(table, _COLUMN_METRICS[name]) if v == v]
+    return [v for v in (METRICS[name](node) for node in nodes) if v is not None]
+
+
+def summarize(
+    name: str, nodes: List[SSHTargetNode], table: Optional[NodeTable] = None
+) -> Optional[Dict[str, float]]:
+    values = sorted(_values(name, nodes, table))
+    if not values:
+        return None
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "max": values[-1],
+    }
+
+
+def summary_text(
+    name: str, nodes: List[SSHTargetNode], table: Optional[NodeTable] = None
+) -> str:
+    summary = summarize(name, nodes, table)
+    if not summary:
+        return f"{name}: no data"
+    return f"{name} " + " ".join(
+        f"{key} {format_metric(name, value)}" for key, value in summary.items()
+    )
+
+
+def dump_metrics(nodes: List[SSHTargetNode], path: str):
+    # raw, unformatted numbers, one row per node
+    with open(path, "w", newline="") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["idx", "ip"] + METRIC_NAMES + ["exit_status"])
+        for node in nodes:
+            values = [METRICS[name](node) for name in METRIC_NAMES]
+            writer.writerow(
+                [node.idx, node.get_ip()]
+                + ["" if value is None else value for value in values]
+                + ["" if node.exit_status is None else node.exit_status]
+            )
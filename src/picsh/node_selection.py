@@ -0,0 +1,146 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" @ node selection expressions """
+
+import bisect
+import fnmatch
+import ipaddress
+import re
+from typing import Dict, List, Set, Tuple
+from picsh.exceptions.picsh_exception import PicshException
+from picsh.node import Node
+
+SELECTION_HELP = (
+    "terms are comma separated: 3, 0-199, *, !13, host or ip, glob (web*), "
+    "re:regex, tag:name, net:10.0.1.0/24, $name; $name=... saves a selection"
+)
+
+_RANGE_RE = re.compile(r"(\d+)(?:-(\d+))?$")
+_NAME_RE = re.compile(r"\w+$")
+
+
+class SelectionError(PicshException):
+    pass
+
+
+class NodeSelector:
+    # Resolves selection expressions to nodes. Lookups by index, name or ip,
+    # tag and subnet go through indexes built once for the node list; only
+    # globs and regexes scan the names. A term adds nodes, a !term removes
+    # them, and an expression that starts with !term starts from all nodes.
+
+    def __init__(self, nodes: List[Node]):
+        self.nodes = list(nodes)
+        self._all: Set[int] = {node.idx for node in nodes}
+        self._by_idx: Dict[int, Node] = {node.idx: node for node in nodes}
+        self._by_name: Dict[str, Set[int]] = {}
+        self._by_tag: Dict[str, Set[int]] = {}
+        # (ip as an int, idx), sorted, per ip version; subnets are ranges
+        self._by_addr: Dict[int, List[Tuple[int, int]]] = {4: [], 6: []}
+        self._named: Dict[str, Set[int]] = {}
+        for node in self.nodes:
+            for name in (node.ip_addr, node.name):
+                if name:
+                    self._by_name.setdefault(name, set()).add(node.idx)
+            for tag in node.tags:
+                self._by_tag.setdefault(tag, set()).add(node.idx)
+            try:
+                addr = ipaddress.ip_address(node.ip_addr)
+            except ValueError:
+                continue
+            self._by_addr[addr.version].append((int(addr), node.idx))
+        for addrs in self._by_addr.values():
+            addrs.sort()
+
+    def select(self, expr: str) -> List[Node]:
+        # "$name=terms" also saves the selection under name
+        name = None
+        if expr.startswith("$") and "=" in expr:
+            name, expr = expr[1:].split("=", 1)
+            if not _NAME_RE.match(name):
+                raise SelectionError(f"bad selection name [{name}].")
+        idxs: Set[int] = set()
+        terms = [term.strip() for term in expr.split(",")]
+        if not terms[0] or terms[0].startswith("!"):
+            idxs = set(self._all)
+        for term in terms:
+            if not term:
+                continue
+            if term.startswith("!"):
+                idxs -= self._resolve(term[1:])
+            else:
+                idxs |= self._resolve(term)
+        if not idxs:
+            raise SelectionError(f"[{expr}] selects no nodes.")
+        if name:
+            self._named[name] = idxs
+        return [self._by_idx[idx] for idx in sorted(idxs)]
+
+    def _resolve(self, term: str) -> Set[int]:
+        if term == "*":
+            return self._all
+        match = _RANGE_RE.match(term)
+        if match:
+            return self._range(term, match)
+        if term.startswith("$"):
+            if term[1:] not in self._named:
+                raise SelectionError(f"no saved selection [{term}].")
+            return self._named[term[1:]]
+        if term.startswith("tag:"):
+            if term[4:] not in self._by_tag:
+                raise SelectionError(f"no nodes tagged [{term[4:]}].")
+            return self._by_tag[term[4:]]
+        if term.startswith("re:"):
+            try:
+                search = re.compile(term[3:]).search
+            except re.error as ex:
+                raise SelectionError(f"bad regex [{term[3:]}]: {ex}.")
+            return self._matching(search)
+        if term.startswith("net:") or "/" in term:
+            return self._subnet(term[4:] if term.startswith("net:") else term)
+        if term in self._by_name:
+            return self._by_name[term]
+        if any(ch in term for ch in "*?["):
+            pattern = re.compile(fnmatch.translate(term))
+            return self._matching(pattern.match)
+        raise SelectionError(f"no node matches [{term}]; {SELECTION_HELP}")
+
+    def _range(self, term: str, match) -> Set[int]:
+        first = int(match.group(1))
+        last = int(match.group(2)) if match.group(2) else first
+        if last < first:
+            raise SelectionError(f"bad range [{term}].")
+        if first == last:
+            if first not in self._by_idx:
+                raise SelectionError(f"no node {first}.")
+            return {first}
+        if last - first >= len(self._all):
+            return {idx for idx in self._all if first <= idx <= last}
+        return self._all.intersection(range(first, last + 1))
+
+    def _subnet(self, cidr: str) -> Set[int]:
+        try:
+            net = ipaddress.ip_network(cidr, strict=False)
+        except ValueError as ex:
+            raise SelectionError(f"bad subnet [{cidr}]: {ex}.")
+        addrs = self._by_addr[net.version]
+        lo = bisect.bisect_left(addrs, (int(net.network_address), -1))
+        hi = bisect.bisect_right(addrs, (int(net.broadcast_address), float("inf")))
+        return {idx for _, idx in addrs[lo:hi]}
+
+    def _matching(self, matcher) -> Set[int]:
+        idxs: Set[int] = set()
+        for name, name_idxs in self._by_name.items():
+            if matcher(name):
+                idxs |= name_idxs
+        return idxs
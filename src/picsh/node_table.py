@@ -0,0 +1,135 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" per-node runtime state in columns, one row per node """
+
+import math
+from array import array
+from typing import Optional
+
+# exit_status of a node whose command has not finished
+_NO_EXIT = -(2**31)
+_NAN = float("nan")
+
+# column name: array typecode, initial value
+_COLUMNS = {
+    "conn_state": ("b", 0),
+    "cmd_state": ("b", 0),
+    "hide": ("b", 0),
+    "exit_status": ("i", _NO_EXIT),
+    "connect_latency": ("d", _NAN),
+    "connect_time": ("d", _NAN),
+    "auth_time": ("d", _NAN),
+    "first_byte_latency": ("d", _NAN),
+    "cmd_duration": ("d", _NAN),
+    "cmd_start_time": ("d", 0.0),
+}
+
+
+class NodeTable:
+    # Connection and command state, exit status and timings of every node in
+    # typed arrays, a row per node. Nodes read and write their row through
+    # the column attributes below; counting, say, the running nodes is then
+    # a count() over one array instead of a walk over 10k+ objects.
+
+    def __init__(self, size: int = 0):
+        self.size = 0
+        for name, (typecode, _) in _COLUMNS.items():
+            setattr(self, name, array(typecode))
+        self.grow(size)
+
+    def grow(self, rows: int):
+        for name, (_, initial) in _COLUMNS.items():
+            getattr(self, name).extend([initial] * rows)
+        self.size += rows
+
+    def add_row(self) -> int:
+        self.grow(1)
+        return self.size - 1
+
+    def count(self, column: str, value) -> int:
+        # rows whose column holds value, an enum member or a plain number
+        return getattr(self, column).count(getattr(value, "value", value))
+
+
+class EnumColumn:
+    # a node attribute stored in its table row as the enum's value
+    def __init__(self, enum_cls):
+        self._members = {member.value: member for member in enum_cls}
+
+    def __set_name__(self, owner, name):
+        self._name = name
+
+    def __get__(self, node, owner=None):
+        if node is None:
+            return self
+        return self._members[getattr(node.table, self._name)[node.row]]
+
+    def __set__(self, node, member):
+        getattr(node.table, self._name)[node.row] = member.value
+
+
+class FlagColumn:
+    def __set_name__(self, owner, name):
+        self._name = name
+
+    def __get__(self, node, owner=None):
+        if node is None:
+            return self
+        return bool(getattr(node.table, self._name)[node.row])
+
+    def __set__(self, node, value: bool):
+        getattr(node.table, self._name)[node.row] = 1 if value else 0
+
+
+class FloatColumn:
+    def __set_name__(self, owner, name):
+        self._name = name
+
+    def __get__(self, node, owner=None) -> float:
+        if node is None:
+            return self
+        return getattr(node.table, self._name)[node.row]
+
+    def __set__(self, node, value: float):
+        getattr(node.table, self._name)[node.row] = value
+
+
+class OptionalIntColumn:
+    # None is kept as a sentinel no exit status can take
+    def __set_name__(self, owner, name):
+        self._name = name
+
+    def __get__(self, node, owner=None) -> Optional[int]:
+        if node is None:
+            return self
+        value = getattr(node.table, self._name)[node.row]
+        return None if value == _NO_EXIT else value
+
+    def __set__(self, node, value: Optional[int]):
+        getattr(node.table, self._name)[node.row] = _NO_EXIT if value is None else value
+
+
+class OptionalFloatColumn:
+    # None is kept as nan
+    def __set_name__(self, owner, name):
+        self._name = name
+
+    def __get__(self, node, owner=None) -> Optional[float]:
+        if node is None:
+            return self
+        value = getattr(node.table, self._name)[node.row]
+        return None if math.isnan(value) else value
+
+    def __set__(self, node, value: Optional[float]):
+        getattr(node.table, self._name)[node.row] = _NAN if value is None else value
+
@@ -0,0 +1,374 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" bounded per-node store for received output """
+
+import bisect
+import hashlib
+import logging
+import os
+import tempfile
+from array import array
+from typing import List, Optional, Tuple
+
+DEFAULT_NODE_OUTPUT_BYTES = 4 * 1024 * 1024
+DEFAULT_TOTAL_OUTPUT_BYTES = 256 * 1024 * 1024
+DEFAULT_NODE_SPILL_BYTES = 64 * 1024 * 1024
+DEFAULT_TOTAL_SPILL_BYTES = 4 * 1024 * 1024 * 1024
+
+# compact the line list once this many trimmed slots have accumulated
+_COMPACT_THRESHOLD = 1024
+# a spill file is compacted once its dropped lines outweigh the kept ones
+# and come to at least this much
+_MIN_COMPACT_BYTES = 4 * 1024 * 1024
+_COMPACT_CHUNK_BYTES = 1024 * 1024
+# digest() of a buffer that has received nothing
+_EMPTY_HASH = hashlib.blake2b(digest_size=16)
+
+
+class BufferBudget:
+    # A cap on the bytes held by all the output buffers that share it, and
+    # one on the bytes they spilled to disk. When either is exceeded, a buffer
+    # that holds more than its fair share trims itself on its next append, so
+    # the chattiest nodes give up their history first.
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_TOTAL_OUTPUT_BYTES,
+        max_spill_bytes: int = DEFAULT_TOTAL_SPILL_BYTES,
+    ):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.max_spill_bytes = max_spill_bytes
+        self.spilled_bytes = 0
+        self.num_buffers = 0
+
+    def exceeded(self):
+        return self.used_bytes > self.max_bytes
+
+    def fair_share(self):
+        return self.max_bytes // max(self.num_buffers, 1)
+
+    def spill_exceeded(self):
+        return self.spilled_bytes > self.max_spill_bytes
+
+    def fair_spill_share(self):
+        return self.max_spill_bytes // max(self.num_buffers, 1)
+
+
+class _SpillStore:
+    # Lines pushed out of memory, oldest first, appended to one anonymous temp
+    # file (a single fd per node) with the offset of each line. Once more than
+    # max_bytes are on disk, or the budget's spill cap is exceeded, the oldest
+    # lines are dropped by moving the start; the live bytes are copied to the
+    # front of the file once the dropped ones outweigh them.
+
+    def __init__(self, max_bytes: int, budget: Optional[BufferBudget] = None):
+        self.max_bytes = max_bytes
+        self._budget = budget
+        self._fh = tempfile.TemporaryFile(prefix="picsh-")
+        self._offsets = array("Q", [0])
+        # index into _offsets of the first line still kept
+        self._first = 0
+        self.size = 0
+        self.line_count = 0
+
+    def write(self, lines: List[str]) -> Tuple[int, int]:
+        # returns the lines and bytes dropped from the front to stay in
+        # bounds; raises OSError with the store unchanged if the write fails
+        encoded = [line.encode("utf-8", "surrogateescape") + b"\n" for line in lines]
+        data = b"".join(encoded)
+        end = self._offsets[-1]
+        written = 0
+        while written < len(data):
+            written += os.pwrite(self._fh.fileno(), data[written:], end + written)
+        offsets = self._offsets
+        for line in encoded:
+            offsets.append(offsets[-1] + len(line))
+        self._grow(len(data))
+        self.line_count += len(encoded)
+        return self._drop_oldest()
+
+    def line(self, idx: int) -> str:
+        return self.lines(idx, idx + 1)[0]
+
+    def lines(self, start: int, end: int) -> List[str]:
+        # the lines numbered start up to end, relative to the first one kept
+        if start >= end:
+            return []
+        offset = self._offsets[self._first + start]
+        data = os.pread(self._fh.fileno(), self._offsets[self._first + end] - offset, offset)
+        return data[:-1].decode("utf-8", "surrogateescape").split("\n")
+
+    def close(self):
+        self._grow(-self.size)
+        self._fh.close()
+        self.line_count = 0
+
+    def _grow(self, nbytes: int):
+        self.size += nbytes
+        if self._budget:
+            self._budget.spilled_bytes += nbytes
+
+    def _limit(self) -> int:
+        if self._budget is not None and self._budget.spill_exceeded():
+            return min(self.max_bytes, self._budget.fair_spill_share())
+        return self.max_bytes
+
+    def _drop_oldest(self) -> Tuple[int, int]:
+        limit = self._limit()
+        if self.size <= limit:
+            return 0, 0
+        offsets = self._offsets
+        first = bisect.bisect_left(offsets, offsets[-1] - limit, self._first)
+        dropped_lines = first - self._first
+        dropped_bytes = offsets[first] - offsets[self._first]
+        self._first = first
+        self.line_count -= dropped_lines
+        self._grow(-dropped_bytes)
+        if offsets[first] > max(self.size, _MIN_COMPACT_BYTES):
+            try:
+                self._compact()
+            except OSError as ex:
+                logging.warning(f"output spill compaction failed: {ex}")
+        return dropped_lines, dropped_bytes
+
+    def _compact(self):
+        # the kept bytes are fewer than the dropped ones ahead of them, so the
+        # copy never overwrites a kept byte and a failure leaves them intact
+        fd = self._fh.fileno()
+        base = self._offsets[self._first]
+        pos = 0
+        while pos < self.size:
+            chunk = os.pread(fd, min(_COMPACT_CHUNK_BYTES, self.size - pos), base + pos)
+            os.pwrite(fd, chunk, pos)
+            pos += len(chunk)
+        os.ftruncate(fd, self.size)
+        self._offsets = array("Q", [offset - base for offset in self._offsets[self._first :]])
+        self._first = 0
+
+
+class OutputBuffer:
+    # Append-only store of complete lines plus a pending partial line.
+    # Appends are O(len(data)); the oldest lines are dropped once the per-node
+    # cap or the shared budget is exceeded, or with max_spill_bytes set, moved
+    # to a temp file (up to that many bytes) where they can still be read
+    # back. Lines carry absolute line numbers (first_lineno onwards) that stay
+    # stable as old lines are trimmed or spilled.
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_NODE_OUTPUT_BYTES,
+        budget: Optional[BufferBudget] = None,
+        max_spill_bytes: int = 0,
+    ):
+        self.max_bytes = max_bytes
+        self.max_spill_bytes = max_spill_bytes
+        self._spill: Optional[_SpillStore] = None
+        self._budget = budget
+        if budget:
+            budget.num_buffers += 1
+        self._lines: List[str] = []
+        self._start = 0
+        self._tail: List[str] = []
+        self._tail_len = 0
+        self._size = 0
+        self._text = None
+        # created on the first append, most of a big cluster's buffers never
+        # see one before they are cleared
+        self._hash = None
+        self.first_lineno = 0
+        self.bytes_received = 0
+        self.bytes_dropped = 0
+        self.version = 0
+        # bumped by clear(), line numbers restart from 0
+        self.generation = 0
+
+    def __len__(self):
+        return self._size
+
+    def __bool__(self):
+        return self._size > 0
+
+    def append(self, data: str):
+        if not data:
+            return
+        self.bytes_received += len(data)
+        if self._hash is None:
+            self._hash = hashlib.blake2b(digest_size=16)
+        self._hash.update(data.encode("utf-8", "surrogateescape"))
+        self._grow(len(data))
+        parts = data.split("\n")
+        if len(parts) == 1:
+            self._tail.append(data)
+            self._tail_len += len(data)
+        else:
+            self._tail.append(parts[0])
+            self._lines.append("".join(self._tail))
+            self._lines.extend(parts[1:-1])
+            self._tail = [parts[-1]] if parts[-1] else []
+            self._tail_len = len(parts[-1])
+        self._enforce_limits()
+        self._changed()
+
+    def replace(self, data: str):
+        self.clear()
+        self.append(data)
+
+    def clear(self):
+        self._grow(-self._size)
+        if self._spill:
+            self._spill.close()
+            self._spill = None
+        self._lines = []
+        self._start = 0
+        self._tail = []
+        self._tail_len = 0
+        self._hash = None
+        self.first_lineno = 0
+        self.bytes_received = 0
+        self.bytes_dropped = 0
+        self.generation += 1
+        self._changed()
+
+    def digest(self) -> bytes:
+        # hash of everything received since the last clear, trimmed lines included
+        return (self._hash or _EMPTY_HASH).digest()
+
+    def text(self) -> str:
+        # the joined text of the lines held in memory, spilled lines are not
+        # included; cached until the next modification
+        if self._text is None:
+            tail = "".join(self._tail)
+            if self._start < len(self._lines):
+                self._text = "\n".join(self._lines[self._start :]) + "\n" + tail
+            else:
+                self._text = tail
+        return self._text
+
+    def line_count(self) -> int:
+        return (
+            self._spilled_lines()
+            + len(self._lines)
+            - self._start
+            + (1 if self._tail_len else 0)
+        )
+
+    def has_partial_line(self) -> bool:
+        return self._tail_len > 0
+
+    def complete_lines(self, from_lineno: int) -> List[str]:
+        # the complete lines numbered from_lineno (absolute) onwards
+        idx = max(from_lineno - self.first_lineno, 0)
+        spilled = self._spilled_lines()
+        lines = self._spill.lines(idx, spilled) if idx < spilled else []
+        return lines + self._lines[self._start + max(idx - spilled, 0) :]
+
+    def lines(self, start: int, end: int) -> List[str]:
+        # the lines numbered start up to end, relative to the first retained
+        # line; spilled ones come back from a single read
+        spilled = self._spilled_lines()
+        lines = self._spill.lines(start, min(end, spilled)) if start < spilled else []
+        if end > spilled:
+            in_memory = len(self._lines) - self._start
+            lines += self._lines[
+                self._start + max(start - spilled, 0) : self._start + min(end - spilled, in_memory)
+            ]
+            if self._tail_len and end > spilled + in_memory >= start:
+                lines.append("".join(self._tail))
+        return lines
+
+    def line(self, idx: int) -> str:
+        # idx is relative to the first retained line
+        spilled = self._spilled_lines()
+        if idx < spilled:
+            return self._spill.line(idx)
+        idx -= spilled
+        if idx < len(self._lines) - self._start:
+            return self._lines[self._start + idx]
+        return "".join(self._tail)
+
+    def _spilled_lines(self) -> int:
+        return self._spill.line_count if self._spill else 0
+
+    def _grow(self, nbytes):
+        self._size += nbytes
+        if self._budget:
+            self._budget.used_bytes += nbytes
+
+    def _changed(self):
+        self._text = None
+        self.version += 1
+
+    def _limit(self):
+        if self._budget is not None and self._budget.exceeded():
+            return min(self.max_bytes, self._budget.fair_share())
+        return self.max_bytes
+
+    def _over_limit(self):
+        return self._size > self._limit()
+
+    def _spill_oldest(self):
+        # spill down to 3/4 of the limit so that spills come in large batches
+        target = self._limit() * 3 // 4
+        lines = []
+        while self._size > target and self._start < len(self._lines):
+            line = self._lines[self._start]
+            self._lines[self._start] = None
+            self._start += 1
+            self._grow(-(len(line) + 1))
+            lines.append(line)
+        if not lines:
+            return
+        try:
+            if not self._spill:
+                self._spill = _SpillStore(self.max_spill_bytes, self._budget)
+            dropped_lines, dropped_bytes = self._spill.write(lines)
+        except OSError as ex:
+            logging.warning(f"output spill failed, dropping old output instead: {ex}")
+            self._stop_spilling(lines)
+            return
+        self.first_lineno += dropped_lines
+        self.bytes_dropped += dropped_bytes
+
+    def _stop_spilling(self, lines: List[str]):
+        # a full disk or fd table: drop what was spilled and the lines that
+        # were on their way, and only trim from now on
+        if self._spill:
+            self.first_lineno += self._spill.line_count
+            self.bytes_dropped += self._spill.size
+            self._spill.close()
+            self._spill = None
+        self.first_lineno += len(lines)
+        self.bytes_dropped += sum(len(line) + 1 for line in lines)
+        self.max_spill_bytes = 0
+
+    def _enforce_limits(self):
+        if self.max_spill_bytes and self._over_limit():
+            self._spill_oldest()
+        while self._over_limit() and self._start < len(self._lines):
+            line = self._lines[self._start]
+            self._lines[self._start] = None
+            self._start += 1
+            self.first_lineno += 1
+            self.bytes_dropped += len(line) + 1
+            self._grow(-(len(line) + 1))
+        if self._start > _COMPACT_THRESHOLD and self._start * 2 > len(self._lines):
+            del self._lines[: self._start]
+            self._start = 0
+        if self._tail_len > self.max_bytes:
+            # a single unterminated line larger than the cap: keep its end
+            tail = "".join(self._tail)[-self.max_bytes :]
+            dropped = self._tail_len - len(tail)
+            self._tail = [tail]
+            self._tail_len = len(tail)
+            self.bytes_dropped += dropped
+            self._grow(-dropped)
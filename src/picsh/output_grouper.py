@@ -0,0 +1,88 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" dshbak style grouping of nodes with identical output """
+
+from typing import Dict, Iterable, List, Set, Tuple
+from picsh.node import Node
+
+
+def format_node_ranges(idxs: Iterable[int]) -> str:
+    # [0, 1, 2, 5, 7, 8] => "0-2,5,7-8"
+    ranges = []
+    start = prev = None
+    for idx in sorted(idxs):
+        if start is not None and idx == prev + 1:
+            prev = idx
+            continue
+        if start is not None:
+            ranges.append((start, prev))
+        start = prev = idx
+    if start is not None:
+        ranges.append((start, prev))
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+class OutputGrouper:
+    # Groups nodes by the digest of their output. Nodes are re-placed only when
+    # they are passed to update(), and a group's representative and header are
+    # only recomputed when its membership changed.
+
+    def __init__(self):
+        self._digests: Dict[Node, bytes] = {}
+        self._groups: Dict[bytes, Set[Node]] = {}
+        self._group_info: Dict[bytes, Tuple[Node, str]] = {}
+
+    def reset(self, nodes: Iterable[Node]):
+        self._digests = {}
+        self._groups = {}
+        self._group_info = {}
+        for node in nodes:
+            self._place(node, node.recv_buf.digest())
+
+    def update(self, nodes: Iterable[Node]) -> bool:
+        # returns True if any node moved to another group
+        moved = False
+        for node in nodes:
+            old_digest = self._digests.get(node)
+            if old_digest is None:
+                continue
+            digest = node.recv_buf.digest()
+            if digest == old_digest:
+                continue
+            group = self._groups[old_digest]
+            group.discard(node)
+            self._group_info.pop(old_digest, None)
+            if not group:
+                del self._groups[old_digest]
+            self._place(node, digest)
+            moved = True
+        return moved
+
+    def groups(self) -> List[Tuple[Node, str]]:
+        # (representative node, header) per group, ordered by lowest node idx
+        for digest, group in self._groups.items():
+            if digest not in self._group_info:
+                self._group_info[digest] = self._describe(group)
+        return sorted(self._group_info.values(), key=lambda info: info[0].idx)
+
+    def _place(self, node: Node, digest: bytes):
+        self._digests[node] = digest
+        self._groups.setdefault(digest, set()).add(node)
+        self._group_info.pop(digest, None)
+
+    def _describe(self, group: Set[Node]) -> Tuple[Node, str]:
+        representative = min(group, key=lambda node: node.idx)
+        if len(group) == 1:
+            return representative, f"[{representative.idx}] {representative.ip_addr}==>"
+        ranges = format_node_ranges(node.idx for node in group)
+        return representative, f"[{ranges}] {len(group)} nodes==>"
@@ -0,0 +1,108 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" search across the receive buffers of all nodes """
+
+import asyncio
+import re
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+from picsh.node import Node
+
+# yield to the event loop after scanning this many lines
+SCAN_CHUNK_LINES = 5000
+# patterns whose per-node indexes are kept for repeat searches
+MAX_CACHED_PATTERNS = 8
+
+Match = Tuple[Node, int]
+
+
+def compile_pattern(pattern: str) -> Callable[[str], bool]:
+    # "re:..." is a regular expression, anything else a literal string;
+    # raises re.error for a bad expression
+    if pattern.startswith("re:"):
+        return re.compile(pattern[3:]).search
+    return lambda line: pattern in line
+
+
+class _NodeIndex:
+    # the matching line numbers of one node's buffer for one pattern, up to
+    # the first line that has not been scanned yet
+    def __init__(self, generation: int):
+        self.generation = generation
+        self.scanned_lineno = 0
+        self.linenos: List[int] = []
+
+
+class OutputSearch:
+    # Each pattern keeps an index per node of the complete lines it matched.
+    # Searching again only scans lines that arrived since the last search,
+    # unless the buffer was cleared in between. Scans hand control back to the
+    # event loop every SCAN_CHUNK_LINES lines, counted across all nodes.
+
+    def __init__(self):
+        self._indexes: "OrderedDict[str, Dict[Node, _NodeIndex]]" = OrderedDict()
+        # lines left to scan before the next yield
+        self._budget = SCAN_CHUNK_LINES
+
+    async def search(self, pattern: str, nodes: List[Node]) -> List[Match]:
+        matcher = compile_pattern(pattern)
+        indexes = self._indexes.pop(pattern, {})
+        self._indexes[pattern] = indexes
+        while len(self._indexes) > MAX_CACHED_PATTERNS:
+            self._indexes.popitem(last=False)
+        self._budget = SCAN_CHUNK_LINES
+        matches = []
+        for node in nodes:
+            buf = node.recv_buf
+            index = indexes.get(node)
+            if index is None or index.generation != buf.generation:
+                index = _NodeIndex(buf.generation)
+                indexes[node] = index
+            if not await self._scan(index, buf, matcher):
+                # cleared while we yielded, its line numbers are stale
+                del indexes[node]
+                continue
+            matches.extend((node, lineno) for lineno in index.linenos)
+            # the unterminated last line may still grow, check it every time
+            if buf.has_partial_line():
+                last = buf.line_count() - 1
+                if matcher(buf.line(last)):
+                    matches.append((node, buf.first_lineno + last))
+        return matches
+
+    async def _scan(self, index: _NodeIndex, buf, matcher) -> bool:
+        # False if the buffer was cleared while the scan yielded
+        lineno = max(index.scanned_lineno, buf.first_lineno)
+        end = buf.first_lineno + buf.line_count() - (1 if buf.has_partial_line() else 0)
+        while lineno < end:
+            chunk_end = min(lineno + self._budget, end)
+            # one ranged read per window, spilled lines included
+            lines = buf.lines(lineno - buf.first_lineno, chunk_end - buf.first_lineno)
+            for n, line in enumerate(lines, lineno):
+                if matcher(line):
+                    index.linenos.append(n)
+            self._budget -= chunk_end - lineno
+            lineno = chunk_end
+            index.scanned_lineno = lineno
+            if self._budget <= 0:
+                self._budget = SCAN_CHUNK_LINES
+                await asyncio.sleep(0)
+                if index.generation != buf.generation:
+                    return False
+                # output may have been trimmed while we were away
+                if buf.first_lineno > lineno:
+                    lineno = buf.first_lineno
+                end = buf.first_lineno + buf.line_count() - (1 if buf.has_partial_line() else 0)
+        if index.linenos and index.linenos[0] < buf.first_lineno:
+            index.linenos = [n for n in index.linenos if n >= buf.first_lineno]
+        return True
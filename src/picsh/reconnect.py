@@ -0,0 +1,90 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" reconnects nodes that lost their connection """
+
+import asyncio
+import random
+from typing import Dict, List
+from picsh.fanout_window import FanoutWindow
+from picsh.node import ConnectionState, SSHTargetNode
+
+# seconds before the first retry, doubled after every failed one
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+
+
+def backoff_delay(attempt: int, base_delay=BASE_DELAY, max_delay=MAX_DELAY) -> float:
+    # full delay scaled by a random 0.5 - 1.0, so nodes that dropped together
+    # do not all come back in the same instant
+    return min(max_delay, base_delay * 2**attempt) * random.uniform(0.5, 1.0)
+
+
+class Reconnector:
+    # Each node that lost its connection gets one task that retries with
+    # jittered exponential backoff until it is connected again. Handshakes go
+    # through the connect window, which caps how many run at once.
+
+    def __init__(
+        self, connect_window: FanoutWindow, base_delay=BASE_DELAY, max_delay=MAX_DELAY
+    ):
+        self._window = connect_window
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._tasks: Dict[SSHTargetNode, asyncio.Task] = {}
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    def schedule(self, node: SSHTargetNode):
+        if node not in self._tasks:
+            self._start(node, immediate=False)
+
+    def reconnect_all(self, nodes: List[SSHTargetNode]) -> int:
+        # every node that is not connected, right away; returns how many
+        count = 0
+        for node in nodes:
+            if node.conn_state == ConnectionState.CONNECTED:
+                continue
+            task = self._tasks.pop(node, None)
+            if task:
+                task.cancel()
+            self._start(node, immediate=True)
+            count += 1
+        return count
+
+    def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks = {}
+
+    def _start(self, node: SSHTargetNode, immediate: bool):
+        self._tasks[node] = asyncio.ensure_future(self._reconnect(node, immediate))
+
+    async def _reconnect(self, node: SSHTargetNode, immediate: bool):
+        task = asyncio.current_task()
+        attempt = 0
+        delay = 0 if immediate else backoff_delay(0, self._base_delay, self._max_delay)
+        try:
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    await node.ensure_connected(self._window)
+                    return
+                except Exception as ex:
+                    attempt += 1
+                    delay = backoff_delay(attempt, self._base_delay, self._max_delay)
+                    node.show_message(f"reconnect failed: {ex}, retrying in {delay:.0f}s")
+        finally:
+            if self._tasks.get(node) is task:
+                del self._tasks[node]
@@ -0,0 +1,99 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" relay tree: nodes reached through tunnels over other nodes' connections """
+
+import ipaddress
+from collections import OrderedDict
+from typing import Dict, List, Optional, Union
+from picsh.exceptions.picsh_exception import PicshException
+from picsh.node import Node
+
+# nodes in the same subnet of this size share relays
+DEFAULT_RELAY_PREFIX = 24
+# nodes tunneled through one automatically picked relay
+DEFAULT_RELAY_MAX_LEAVES = 256
+
+
+def _subnet(ip: str, prefix: int):
+    try:
+        return ipaddress.ip_network(f"{ip}/{prefix}", strict=False)
+    except ValueError:
+        # a hostname, it gets no relay
+        return None
+
+
+def _auto_relays(nodes: List[Node], prefix: int, max_leaves: int):
+    # the first node of every max_leaves + 1 in a subnet relays for the rest
+    subnets: Dict[object, List[Node]] = OrderedDict()
+    for node in nodes:
+        subnet = _subnet(node.ip_addr, prefix)
+        if subnet is not None:
+            subnets.setdefault(subnet, []).append(node)
+    for members in subnets.values():
+        for start in range(0, len(members), max_leaves + 1):
+            relay, *leaves = members[start : start + max_leaves + 1]
+            for leaf in leaves:
+                leaf.relay = relay
+
+
+def _listed_relays(nodes: List[Node], relay_ips: List[str], prefix: int):
+    # nodes are spread evenly over the listed relays of their subnet
+    by_ip = {node.ip_addr: node for node in nodes}
+    relays_by_subnet: Dict[object, List[Node]] = {}
+    for ip in relay_ips:
+        relay = by_ip.get(str(ip))
+        if relay is None:
+            raise PicshException(f"relay {ip} is not one of the cluster's nodes.")
+        relays_by_subnet.setdefault(_subnet(relay.ip_addr, prefix), []).append(relay)
+    relays = set(by_ip[str(ip)] for ip in relay_ips)
+    next_relay: Dict[object, int] = {}
+    for node in nodes:
+        subnet = _subnet(node.ip_addr, prefix)
+        candidates = relays_by_subnet.get(subnet) if subnet is not None else None
+        if node in relays or not candidates:
+            continue
+        pos = next_relay.get(subnet, 0)
+        node.relay = candidates[pos % len(candidates)]
+        next_relay[subnet] = pos + 1
+
+
+def assign_relays(
+    nodes: List[Node],
+    relays: Union[str, List[str], None],
+    prefix: int = DEFAULT_RELAY_PREFIX,
+    max_leaves: int = DEFAULT_RELAY_MAX_LEAVES,
+    node_relays: Optional[Dict[Node, str]] = None,
+):
+    # relays: "auto", a list of relay node ips, or None for no relay tree.
+    # node_relays: per node overrides, a relay node ip or "none".
+    if relays == "auto":
+        _auto_relays(nodes, prefix, max_leaves)
+    elif relays:
+        _listed_relays(nodes, list(relays), prefix)
+    by_ip = {node.ip_addr: node for node in nodes}
+    for node, relay_ip in (node_relays or {}).items():
+        if str(relay_ip).lower() == "none":
+            node.relay = None
+        elif str(relay_ip) in by_ip:
+            node.relay = by_ip[str(relay_ip)]
+        else:
+            raise PicshException(f"relay {relay_ip} of {node.ip_addr} is not one of the cluster's nodes.")
+    for node in nodes:
+        # a relay may be behind another relay, but not in a loop
+        seen = {node}
+        relay = node.relay
+        while relay is not None:
+            if relay in seen:
+                raise PicshException(f"relay loop at {node.ip_addr}.")
+            seen.add(relay)
+            relay = relay.relay
@@ -0,0 +1,64 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" coalesces repaint requests into frames at a bounded rate """
+
+import asyncio
+from typing import Callable, Dict, Optional
+
+DEFAULT_MAX_FPS = 30
+
+
+class RepaintScheduler:
+    # Repaint requests are collected until the next frame is due, then every
+    # distinct repaint callback runs once and the screen is drawn once. Frames
+    # are at least 1/max_fps apart; flush() draws a pending frame right away.
+
+    def __init__(
+        self,
+        aio_event_loop: asyncio.AbstractEventLoop,
+        draw_screen: Optional[Callable] = None,
+        max_fps: int = DEFAULT_MAX_FPS,
+    ):
+        self._loop = aio_event_loop
+        self._draw_screen = draw_screen
+        self._frame_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self._pending: Dict[Callable, None] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._last_frame = 0.0
+        self.notifications = 0
+        self.frames = 0
+
+    def request(self, repaint_func: Callable):
+        self.notifications += 1
+        self._pending[repaint_func] = None
+        if self._timer is None:
+            delay = self._last_frame + self._frame_interval - self._loop.time()
+            self._timer = self._loop.call_later(max(delay, 0.0), self._frame)
+
+    def flush(self, draw: bool = True):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._frame(draw)
+
+    def stats(self):
+        return {"notifications": self.notifications, "frames": self.frames}
+
+    def _frame(self, draw: bool = True):
+        self._timer = None
+        self._last_frame = self._loop.time()
+        pending, self._pending = self._pending, {}
+        for repaint_func in pending:
+            repaint_func()
+        self.frames += 1
+        if draw and self._draw_screen:
+            self._draw_screen()
@@ -0,0 +1,141 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" records every node's output to a per-session directory on disk """
+
+import asyncio
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, List
+
+DEFAULT_MAX_FILE_BYTES = 64 * 1024 * 1024
+DEFAULT_KEEP_FILES = 5
+# how long received output may sit in memory before it is written
+FLUSH_INTERVAL = 0.5
+# write right away once this much output is pending
+FLUSH_BYTES = 1024 * 1024
+
+
+def new_session_dir(base_dir: str) -> str:
+    return os.path.join(base_dir, time.strftime("session-%Y%m%d-%H%M%S"))
+
+
+def _timestamp():
+    return time.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class SessionRecorder:
+    # Output is collected per node on the event loop and handed in batches to
+    # a single writer thread, so disk I/O never runs on the UI path and each
+    # node's file sees its writes in order. A node's file is rotated to .1, .2
+    # ... once it grows past max_file_bytes, keep_files files in all.
+
+    def __init__(
+        self,
+        session_dir: str,
+        max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+        keep_files: int = DEFAULT_KEEP_FILES,
+    ):
+        os.makedirs(session_dir, exist_ok=True)
+        self.session_dir = session_dir
+        self._max_file_bytes = max_file_bytes
+        self._keep_files = keep_files
+        self._pending: Dict[object, List[str]] = {}
+        self._pending_bytes = 0
+        self._at_line_start: Dict[object, bool] = {}
+        self._flush_timer = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        # only touched from the writer thread
+        self._files: Dict[object, BinaryIO] = {}
+
+    def record(self, node, data: str):
+        if not data:
+            return
+        self._pending.setdefault(node, []).append(data)
+        self._pending_bytes += len(data)
+        self._at_line_start[node] = data.endswith("\n")
+        if self._pending_bytes >= FLUSH_BYTES:
+            self.flush()
+        elif self._flush_timer is None:
+            loop = asyncio.get_event_loop()
+            self._flush_timer = loop.call_later(FLUSH_INTERVAL, self.flush)
+
+    def command_started(self, node, cmd: str):
+        self._mark(node, f"{_timestamp()} $ {cmd}")
+
+    def command_finished(self, node):
+        if node.exit_status is None:
+            result = "no exit status"
+        else:
+            result = f"exit {node.exit_status}"
+        self._mark(node, f"{_timestamp()} {result} ({node.cmd_duration:.3f}s)")
+
+    def flush(self):
+        if self._flush_timer:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._pending_bytes = 0
+        self._executor.submit(self._write_batch, batch)
+
+    def close(self):
+        self.flush()
+        self._executor.submit(self._close_files)
+        self._executor.shutdown(wait=True)
+
+    def _mark(self, node, text: str):
+        newline = "" if self._at_line_start.get(node, True) else "\n"
+        self.record(node, f"{newline}=== {text} ===\n")
+
+    def _write_batch(self, batch: Dict[object, List[str]]):
+        for node, chunks in batch.items():
+            try:
+                fh = self._file_for(node)
+                fh.write("".join(chunks).encode("utf-8", "replace"))
+                if fh.tell() >= self._max_file_bytes:
+                    self._rotate(node)
+            except OSError as ex:
+                logging.error(f"session recorder: {ex}")
+
+    def _path_for(self, node) -> str:
+        name = re.sub(r"[^\w.-]", "_", f"node{node.idx}-{node.get_ip()}")
+        return os.path.join(self.session_dir, name + ".log")
+
+    def _file_for(self, node) -> BinaryIO:
+        fh = self._files.get(node)
+        if fh is None:
+            fh = open(self._path_for(node), "ab")
+            self._files[node] = fh
+        return fh
+
+    def _rotate(self, node):
+        # keep_files counts the live file too: it and .1 ... .{keep_files - 1}
+        self._files.pop(node).close()
+        path = self._path_for(node)
+        if self._keep_files <= 1:
+            os.remove(path)
+            return
+        for idx in range(self._keep_files - 2, 0, -1):
+            older = f"{path}.{idx}"
+            if os.path.exists(older):
+                os.replace(older, f"{path}.{idx + 1}")
+        os.replace(path, f"{path}.1")
+
+    def _close_files(self):
+        for fh in self._files.values():
+            fh.close()
+        self._files = {}
@@ -0,0 +1,73 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" parsed cluster spec yaml, cached on disk by path and mtime """
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import yaml
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".picsh", "cache")
+# bump when the cached layout changes
+_CACHE_VERSION = 1
+
+# the libyaml loader is many times faster on big inventories
+_Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def _cache_path(path: str, cache_dir: str) -> str:
+    digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, f"spec-{digest}.pickle")
+
+
+def _stat_key(st: os.stat_result):
+    return (_CACHE_VERSION, st.st_mtime_ns, st.st_size)
+
+
+def load_spec_yaml(path: str, cache_dir: str = DEFAULT_CACHE_DIR):
+    # the parsed yaml at path; parsed again only when the file's mtime or
+    # size changed since it was cached
+    key = _stat_key(os.stat(path))
+    cache_path = _cache_path(path, cache_dir)
+    try:
+        with open(cache_path, "rb") as fh:
+            cached_key, data = pickle.load(fh)
+        if cached_key == key:
+            return data
+    except OSError:
+        pass
+    except Exception as ex:
+        # truncated, or written by another version; parse the yaml instead
+        logging.warning(f"spec cache: ignoring {cache_path}: {ex!r}")
+    with open(path, "rb") as fh:
+        data = yaml.load(fh, Loader=_Loader)
+    _write_cache(cache_path, key, data)
+    return data
+
+
+def _write_cache(cache_path: str, key, data):
+    # written to a temp file and renamed, a concurrent reader never sees
+    # half a cache file
+    tmp_path = None
+    try:
+        os.makedirs(os.path.dirname(cache_path), mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path))
+        with os.fdopen(fd, "wb") as fh:
+            pickle.dump((key, data), fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except (OSError, pickle.PicklingError) as ex:
+        logging.warning(f"spec cache: {ex}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
@@ -0,0 +1,49 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+""" --startup-profile: time spent in each startup phase """
+
+import atexit
+import sys
+import time
+
+# imported first thing by bin/picsh, so this is about when picsh started
+_start = time.perf_counter()
+_marks = []
+_enabled = False
+
+
+def enable():
+    global _enabled
+    if not _enabled:
+        _enabled = True
+        atexit.register(report)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def mark(phase: str):
+    # phase: what picsh was doing since the previous mark; recorded even
+    # before enable(), which only runs once the arguments are parsed
+    _marks.append((phase, time.perf_counter()))
+
+
+def report(out=None):
+    out = out or sys.stderr
+    out.write("picsh startup profile:\n")
+    prev = _start
+    for phase, at in _marks:
+        out.write(f"  {phase:<28} {(at - prev) * 1000:8.1f} ms {(at - _start) * 1000:8.1f} ms\n")
+        prev = at
+    out.flush()
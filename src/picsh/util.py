@@ -13,7 +13,6 @@
 """ utility functions """
 
 import logging
-import colorama
 
 
 def setup_logger(sname):
@@ -32,6 +31,8 @@ def setup_logger(sname):
 
 
 def get_logo():
+    import colorama
+
     s_logo = """
                             ┌─┐@s╦╔═╗@e┌─┐┬ ┬
                             ├─┘@s║║  @e└─┐├─┤
@@ -48,3 +49,12 @@ def get_tagline():
                     https://github.com/carlsborg/picsh 
     """
     return s_github
+
+
+def parse_rate(text):
+    # "500K", "20M", "1G" or plain bytes/sec
+    units = {"K": 1024, "M": 1024**2, "G": 1024**3}
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
@@ -14,7 +14,6 @@
 from typing import Callable, List
 import urwid
 from picsh.widgets.selectable_row import SelectableRow
-from picsh.node import Node
 from picsh.widgets.listbox_with_mouse_events import ListBoxWithMouseEvents
 import os
 
@@ -35,7 +34,7 @@ class ClusterSelectionView:
         self.listbox_content = urwid.SimpleFocusListWalker([self.column_headers])
         listbox = urwid.ListBox(self.listbox_content)
         listbox = urwid.AttrWrap(listbox, "body")
-        self._output_textbox = urwid.Text("This is some text. " * 200)
+        self._output_textbox = urwid.Text("")
         textbox = self._output_textbox
 
         self._footer = urwid.Text(footer_text)
@@ -64,11 +63,8 @@ class ClusterSelectionView:
             listbox_content.append(SelectableRow((base_name, ""), idx))
         self.listbox_content[:] = urwid.SimpleFocusListWalker(listbox_content)
 
-    def show_cluster_spec(self, cluster_spec_paths: List[str]):
-        spec_idx = self.get_selected_spec_idx()
-        with open(cluster_spec_paths[spec_idx], "rt") as fh:
-            buf = fh.read()
-            self._output_textbox.set_text(buf)
+    def show_cluster_spec(self, text: str):
+        self._output_textbox.set_text(text)
 
     def outer_widget(self):
         return self._frame
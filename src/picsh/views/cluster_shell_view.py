@@ -11,24 +11,29 @@
 #
 
 
-from typing import Callable, List
+from typing import Callable, Iterable, List, Optional
 
 import urwid
 
 from picsh.node import Node
+from picsh.output_grouper import OutputGrouper
 from picsh.widgets.listbox_with_mouse_events import ListBoxWithMouseEvents
+from picsh.widgets.node_output_walker import NodeOutputWalker
 
 
 class ClusterShellView:
     def __init__(self, state_change_notifier: Callable):
         self._state_change_notifier = state_change_notifier
         self._footer = urwid.Text("Esc => node view | Alt-C reconnect all")
-        self._listbox_content = urwid.SimpleListWalker([])
+        self._listbox_content = NodeOutputWalker()
         self._listbox = ListBoxWithMouseEvents(self._listbox_content)
         self._terminal_input_cmd = None
         self._outer_widget = urwid.Filler(urwid.Text(""))
         self._node_selection_filter = ""
         self.term = None
+        self._visible_nodes: List[Node] = []
+        self._grouper = OutputGrouper()
+        self.grouped = False
 
     def set_selection_filter(self, selection_filter):
         self._node_selection_filter = selection_filter
@@ -59,16 +64,41 @@ class ClusterShellView:
             ]
         )
 
-    def repaint_shell_output(self, nodes: List[Node]):
-        list_contents = []
-        for node in nodes:
-            if not node.hide:
-                separater = f"[{str(node.idx)}] {node.ip_addr}==>"
-                list_contents.append(
-                    urwid.AttrMap(urwid.Text(separater), "output_separater")
-                )
-                list_contents.append(urwid.Text(node.recv_buf))
-        self._listbox_content[:] = urwid.SimpleListWalker(list_contents)
+    def repaint_shell_output(
+        self, nodes: List[Node], dirty_nodes: Optional[Iterable[Node]] = None
+    ):
+        # lines are fetched lazily by the walker, so a repaint only has to
+        # tell the listbox that something on it may have changed
+        if self.grouped:
+            self._repaint_grouped_output(nodes, dirty_nodes)
+        elif dirty_nodes is None:
+            visible_nodes = [node for node in nodes if not node.hide]
+            if visible_nodes != self._visible_nodes:
+                self._visible_nodes = visible_nodes
+                self._listbox_content.set_nodes(visible_nodes)
+            else:
+                self._listbox_content.refresh()
+        elif any(not node.hide for node in dirty_nodes):
+            self._listbox_content.refresh()
+
+    def _repaint_grouped_output(
+        self, nodes: List[Node], dirty_nodes: Optional[Iterable[Node]]
+    ):
+        # one block per distinct output, headed by the node ranges sharing it
+        if dirty_nodes is None:
+            self._grouper.reset(node for node in nodes if not node.hide)
+        elif not self._grouper.update(dirty_nodes):
+            self._listbox_content.refresh()
+            return
+        groups = self._grouper.groups()
+        self._visible_nodes = []
+        self._listbox_content.set_nodes(
+            [node for node, _ in groups], {node: header for node, header in groups}
+        )
+
+    def toggle_grouping(self):
+        self.grouped = not self.grouped
+        self._visible_nodes = []
 
     def outer_widget(self):
         return self._outer_widget
@@ -86,5 +116,5 @@ class ClusterShellView:
         return "picsh >> cluster shell"
 
     def footer_text(self):
-        return [("footer_title", "Ctrl B"), " buffers ", ("footer_title", "Ctrl Q"), " quit ", ]
+        return [("footer_title", "Ctrl B"), " buffers ", ("footer_title", "Ctrl G"), " group output ", ("footer_title", ":find"), " search ", ("footer_title", "Alt M"), " metric ", ("footer_title", "Alt D"), " dump metrics ", ("footer_title", "Alt C"), " reconnect all ", ("footer_title", "Ctrl Q"), " quit ", ]
 
@@ -10,13 +10,50 @@
 # FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
 #
 
-from typing import Callable, List
+from typing import Callable, Dict, Iterable, List, Optional
 
 import urwid
 
-from picsh.node import Node
+from picsh.node import Node, ConnectionState, CommandState
+from picsh.node_table import NodeTable
+from picsh.node_metrics import METRICS, format_metric, summary_text
 from picsh.widgets.selectable_row import SelectableRow
 
+# ip, state, metric
+_COLUMN_WIDTHS = (20, 16, 8)
+
+
+def _transfer_text(progress):
+    if not progress.started:
+        return f"{progress.kind} queued"
+    if progress.error:
+        return f"{progress.kind} failed"
+    rate = format_metric("xfer", progress.rate())
+    if progress.finished:
+        return f"{progress.kind}ed {rate}"
+    return f"{progress.kind} {progress.fraction() * 100:.0f}% {rate}"
+
+
+def _state_text(node: Node):
+    if node.transfer:
+        return _transfer_text(node.transfer)
+    if node.conn_state == ConnectionState.CONNECTED:
+        if node.cmd_state == CommandState.RUNNING:
+            return "running"
+        if node.cmd_state == CommandState.FINISHED:
+            if node.exit_status is None:
+                return "lost"
+            result = "ok" if node.exit_status == 0 else f"rc {node.exit_status}"
+            return f"{result} {node.cmd_duration:.2f}s"
+        return f"up {node.connect_latency:.2f}s"
+    if node.conn_state == ConnectionState.CONNECTING:
+        return "connecting"
+    if node.conn_state == ConnectionState.QUEUED:
+        return "queued"
+    if node.conn_state == ConnectionState.FAILED:
+        return "failed"
+    return ""
+
 
 class NodePanelView:
     def __init__(
@@ -32,33 +69,50 @@ class NodePanelView:
         self._single_shell_view = single_shell_view
 
         self.active_right_pane = self._cluster_shell_view
+        self.metric = "bytes"
 
+        self._metric_header = urwid.Text(self.metric, align="left")
         self.column_headers = urwid.AttrMap(
             urwid.Columns(
                 [
-                    ("fixed", 40, urwid.Text("    IP", align="left")),
-                    ("fixed", 6, urwid.Text("bytes", align="left")),
+                    ("fixed", _COLUMN_WIDTHS[0], urwid.Text("    IP", align="left")),
+                    ("fixed", _COLUMN_WIDTHS[1], urwid.Text("   state", align="left")),
+                    ("fixed", _COLUMN_WIDTHS[2], self._metric_header),
                 ]
             ),
             "column_headers",
         )
         self.listbox_content = urwid.SimpleFocusListWalker([self.column_headers])
+        self._rows: Dict[Node, SelectableRow] = {}
+        self._row_nodes: List[Node] = []
+        self._node_table: Optional[NodeTable] = None
         self._left_panel_listbox = urwid.AttrWrap(
             urwid.ListBox(self.listbox_content), "node_list"
         )
+        self._summary_text = urwid.Text("", wrap="clip")
+        self._left_panel = urwid.Pile(
+            [
+                self._left_panel_listbox,
+                ("pack", urwid.AttrMap(self._summary_text, "column_headers")),
+            ]
+        )
 
         self._header_text = urwid.Text(self.active_right_pane.header_nav_text())
-        header = urwid.AttrMap(self._header_text, "header_style")
+        self._status_text = urwid.Text("", align="right")
+        header = urwid.AttrMap(
+            urwid.Columns([self._header_text, self._status_text]), "header_style"
+        )
 
         self._output_textbox = urwid.Text("(no right panel rendered)")
         textbox = urwid.Filler(self._output_textbox, valign="top")
         right_panel = urwid.AttrMap(textbox, "node_text")
 
         self._footer = urwid.Text("")
+        self._prompt: Optional[urwid.Edit] = None
 
         self._cols = urwid.Columns(
             [
-                ("fixed", 47, urwid.LineBox(self._left_panel_listbox)),
+                ("fixed", 47, urwid.LineBox(self._left_panel)),
                 ("weight", 75, right_panel),
             ]
         )
@@ -69,22 +123,62 @@ class NodePanelView:
         )
         self._focus = "nodes"
 
-    def set_noderows(self, nodes: List[Node]):
-        listbox_content = [self.column_headers]
-        for idx, node in enumerate(nodes):
-            node_str = f"{str(node.idx).rjust(2)}] {node.get_ip()}"
-            coldata = (node_str, str(len(node.recv_buf)))
-            listbox_content.append(SelectableRow(coldata, node.idx))
-        self.listbox_content[:] = urwid.SimpleFocusListWalker(listbox_content)
+    def set_noderows(
+        self, nodes: List[Node], dirty_nodes: Optional[Iterable[Node]] = None
+    ):
+        # rows are built once per node list; repaints patch cells in place.
+        # The summary sorts every node's value, it is only redone on a full
+        # repaint here and otherwise by refresh_summary on a timer
+        if dirty_nodes is None:
+            if nodes != self._row_nodes:
+                self._build_noderows(nodes)
+            self.refresh_rows(nodes)
+            self.refresh_summary(nodes, self._node_table)
+        else:
+            self.refresh_rows(dirty_nodes)
+
+    def refresh_rows(self, nodes: Iterable[Node]):
+        metric = METRICS[self.metric]
+        for node in nodes:
+            row = self._rows.get(node)
+            if row:
+                row.set_cell_text(1, _state_text(node))
+                row.set_cell_text(2, format_metric(self.metric, metric(node)))
+
+    def set_node_table(self, node_table: Optional[NodeTable]):
+        # node_table: the NodeTable whose rows are the nodes shown, if any
+        self._node_table = node_table
+
+    def refresh_summary(self, nodes: List[Node], node_table: Optional[NodeTable] = None):
+        text = summary_text(self.metric, nodes, node_table)
+        if self._summary_text.text != text:
+            self._summary_text.set_text(text)
+
+    def set_metric(self, metric: str):
+        # the caller repaints all rows afterwards
+        self.metric = metric
+        self._metric_header.set_text(metric)
+
+    def _build_noderows(self, nodes: List[Node]):
+        rows = {}
+        for node in nodes:
+            row = self._rows.get(node)
+            if not row:
+                node_str = f"{str(node.idx).rjust(2)}] {node.get_ip()}"
+                row = SelectableRow((node_str, "", ""), node.idx, widths=_COLUMN_WIDTHS)
+            rows[node] = row
+        self._rows = rows
+        self._row_nodes = list(nodes)
+        self.listbox_content[:] = [self.column_headers] + list(rows.values())
 
     def show_recv_buffer(self, nodes: List[Node]):
         node_idx = self.get_selected_node_idx()
-        self._output_textbox.set_text(nodes[node_idx].recv_buf)
+        self._output_textbox.set_text(nodes[node_idx].recv_buf.text())
 
     def outer_widget(self):
         left_panel = (
             urwid.LineBox(
-                self._left_panel_listbox, lline="", rline="", bline="", tline=""
+                self._left_panel, lline="", rline="", bline="", tline=""
             ),
             urwid.Columns.options("given", 47, True),
         )
@@ -109,11 +203,39 @@ class NodePanelView:
     def get_selected_node_idx(self):
         return self.listbox_content.focus - 1
 
+    def select_node(self, node: Node):
+        row = self._rows.get(node)
+        if row:
+            self.listbox_content.set_focus(self.listbox_content.index(row))
+
+    def open_prompt(self, caption: str):
+        # a one line edit in place of the footer, which takes the keyboard
+        self._prompt = urwid.Edit(caption)
+        self._frame.footer = urwid.AttrMap(self._prompt, "footer_style")
+        self._frame.focus_position = "footer"
+
+    def close_prompt(self) -> str:
+        text = self._prompt.edit_text if self._prompt else ""
+        self._prompt = None
+        self._frame.footer = urwid.AttrMap(self._footer, "footer_style")
+        self._frame.focus_position = "body"
+        return text
+
+    def prompt_keypress(self, key: str):
+        self._prompt.keypress((self._prompt.pack()[0] + 1,), key)
+
+    def prompt_open(self) -> bool:
+        return self._prompt is not None
+
     def set_focus(self, on_right_panel: bool):
         self._cols.set_focus(1 if on_right_panel else 0)
 
     def set_header_nav_text(self, text: str):
         self._header_text.set_text(text)
 
+    def set_status_text(self, text: str):
+        if self._status_text.text != text:
+            self._status_text.set_text(text)
+
     def set_footer_text(self, text: str):
         self._footer.set_text(text)
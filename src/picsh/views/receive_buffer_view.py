@@ -11,25 +11,36 @@
 #
 
 
-from typing import Callable, List
+from typing import Callable, Iterable, List, Optional
 import urwid
-from picsh.widgets.selectable_row import SelectableRow
 from picsh.node import Node
 from picsh.widgets.listbox_with_mouse_events import ListBoxWithMouseEvents
+from picsh.widgets.node_output_walker import NodeOutputWalker
 
 
 class ReceiveBufferView:
     def __init__(self, state_change_notifier: Callable):
         self._state_change_notifier = state_change_notifier
-        self._output_textbox = urwid.Text("  ")
-        textbox = self._output_textbox
-        self._outer_widget = ListBoxWithMouseEvents(
-            urwid.SimpleFocusListWalker([textbox])
-        )
+        # lines are read from the buffer (or its spill file) only as they
+        # scroll into view, so switching nodes costs the same for any size
+        self._listbox_content = NodeOutputWalker()
+        self._outer_widget = ListBoxWithMouseEvents(self._listbox_content)
+        self._node: Optional[Node] = None
         self._focus = "nodes"
 
     def on_node_list_modified(self, nodes: List[Node], node_idx):
-        self._output_textbox.set_text(nodes[node_idx].recv_buf)
+        self._node = nodes[node_idx]
+        self._listbox_content.set_nodes([self._node])
+
+    def show_line(self, node: Node, lineno: int):
+        # the node has to be the one on display already
+        self._listbox_content.set_highlight((node, lineno))
+        self._listbox_content.set_focus((node, lineno))
+        self._outer_widget.set_focus_valign("middle")
+
+    def repaint_buffer(self, dirty_nodes: Optional[Iterable[Node]] = None):
+        if self._node and (dirty_nodes is None or self._node in dirty_nodes):
+            self._listbox_content.refresh()
 
     def outer_widget(self):
         return self._outer_widget
@@ -38,4 +49,4 @@ class ReceiveBufferView:
         return "picsh >> response buffers"
 
     def footer_text(self):
-        return [("footer_title", "Ctrl S"), " cluster shell ", ("footer_title", "Enter"), " node ssh ", ("footer_title", "Ctrl Q"), " quit ", ]
+        return [("footer_title", "Ctrl S"), " cluster shell ", ("footer_title", "Enter"), " node ssh ", ("footer_title", "/"), " search ", ("footer_title", "Alt N/P"), " next/prev match ", ("footer_title", "Alt M"), " metric ", ("footer_title", "Alt D"), " dump metrics ", ("footer_title", "Ctrl Q"), " quit ", ]
@@ -10,60 +10,147 @@
 # FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
 #
 
+import asyncio
 import logging
-from typing import List, Callable
 import os
+from collections import OrderedDict
+from typing import List, Callable
+import asyncssh
 import urwid
 from picsh.node import Node
 
+# terminals kept open; the least recently used one past this is closed
+MAX_OPEN_TERMINALS = 8
 
-class _SingleShellTerminal:
-    def __init__(self, node, loop):
-        self._node = node
-        self._loop = loop
-        self.terminal_widget = urwid.Terminal(
-            self._run_ssh_command,
+
+class _PtySession(asyncssh.SSHClientSession):
+    def __init__(self, terminal: "_SingleShellTerminal"):
+        self._terminal = terminal
+
+    def data_received(self, data, datatype):
+        self._terminal.on_data(data)
+
+    def connection_lost(self, exc):
+        self._terminal.on_closed(exc)
+
+
+class _SingleShellTerminal(urwid.Terminal):
+    # urwid's terminal emulator fed from a pty channel on the node's existing
+    # ssh connection instead of a forked ssh process. Keys that urwid writes
+    # to self.master go through a pipe and on to the channel.
+
+    def __init__(self, node, loop, on_output: Callable):
+        super().__init__(
+            None,
             main_loop=loop,
-            env=None,
+            env={},
             encoding="utf-8",
             escape_sequence="ctrl a",
         )
-        self.exited = False
+        self._node = node
+        self._on_output = on_output
+        self._chan = None
+        self._key_reader = None
+
+    def spawn(self):
+        # pid 0: nothing to wait for or kill in terminate()
+        self.pid = 0
+        self._key_reader, self.master = os.pipe()
+        os.set_blocking(self._key_reader, False)
+        aio_loop = asyncio.get_event_loop()
+        aio_loop.add_reader(self._key_reader, self._forward_keys)
+        aio_loop.create_task(self._open_channel())
 
-    def _run_ssh_command(self):
-        key_opt = ""
-        key_path = self._node.get_ssh_key_path()
-        if key_path:
-            key_opt = f"-i {self._node.get_ssh_key_path()}"
-        ssh_cmd = f"TERM=linux ssh {key_opt} {self._node.get_login_user()}@{self._node.get_ip()}"
-        logging.info(ssh_cmd)
-        os.system(ssh_cmd)
-        # self.terminal_widget.terminate()
-        self.exited = True
+    async def _open_channel(self):
+        try:
+            self._chan = await self._node.open_pty_session(
+                lambda: _PtySession(self), self.width or 80, self.height or 24
+            )
+        except Exception as ex:
+            logging.info(f"single shell {self._node.get_ip()}: {ex}")
+            self.on_data(f"picsh: could not open a shell: {ex}\r\n".encode("utf-8"))
+            return
+        if self.terminated:
+            self._chan.close()
+
+    def _forward_keys(self):
+        try:
+            data = os.read(self._key_reader, 4096)
+        except BlockingIOError:
+            return
+        if self._chan and data:
+            self._chan.write(data)
+
+    def on_data(self, data: bytes):
+        if self.terminated or not self.term:
+            return
+        self.term.addstr(data)
+        self.flush_responses()
+        self._invalidate()
+        self._on_output()
+
+    def on_closed(self, exc):
+        self._chan = None
+        self.terminate()
+        self._emit("closed")
+        self._on_output()
+
+    def set_termsize(self, width: int, height: int):
+        if self._chan:
+            self._chan.change_terminal_size(width, height)
+
+    def add_watch(self):
+        pass
+
+    def remove_watch(self):
+        pass
+
+    def terminate(self):
+        if self.terminated:
+            return
+        super().terminate()
+        if self._chan:
+            self._chan.close()
+        if self._key_reader is not None:
+            asyncio.get_event_loop().remove_reader(self._key_reader)
+            os.close(self._key_reader)
+            os.close(self.master)
+            self._key_reader = None
 
 
 class SingleShellView:
     def __init__(self, state_change_notifier: Callable):
         self._state_change_notifier = state_change_notifier
-        self._terminals = {}  # node_idx : term
+        # node_idx : term, least recently used first
+        self._terminals: "OrderedDict[int, _SingleShellTerminal]" = OrderedDict()
         self._outer_widget = urwid.Filler(urwid.Text(""))
         self._cur_node_ip = ""
 
     def outer_widget(self):
         return self._outer_widget
 
-    def switch_to_terminal(self, node, urwid_loop):
-        single_shell_term = self._terminals.get(node.idx)
-        if single_shell_term and single_shell_term.terminal_widget.terminated:
-            del self._terminals[node.idx]
+    def switch_to_terminal(self, node, urwid_loop, on_output: Callable):
+        single_shell_term = self._terminals.pop(node.idx, None)
+        if single_shell_term and single_shell_term.terminated:
             single_shell_term = None
         if not single_shell_term:
-            single_shell_term = _SingleShellTerminal(node, urwid_loop)
-            self._terminals[node.idx] = single_shell_term
+            single_shell_term = _SingleShellTerminal(node, urwid_loop, on_output)
+        self._terminals[node.idx] = single_shell_term
+        self._evict_idle_terminals()
         self._cur_node_ip = f"[{node.idx}] ({node.get_ip()})"
-        self._outer_widget = self._terminals[node.idx].terminal_widget
+        self._outer_widget = single_shell_term
         return
 
+    def _evict_idle_terminals(self):
+        while len(self._terminals) > MAX_OPEN_TERMINALS:
+            _, term = self._terminals.popitem(last=False)
+            term.terminate()
+
+    def close_terminals(self):
+        for term in self._terminals.values():
+            term.terminate()
+        self._terminals.clear()
+
     def on_node_list_modified(self, nodes: List[Node], node_idx):
         pass
 
@@ -71,4 +158,4 @@ class SingleShellView:
         return f"picsh >> ssh to node {self._cur_node_ip}"
 
     def footer_text(self):
-        return [("footer_title", "Ctrl B"), " buffers ", ("footer_title", "Ctrl S"), " cluster shell ",("footer_title", "Ctrl Q"), " quit ", ]
+        return [("footer_title", "Ctrl B"), " buffers ", ("footer_title", "Ctrl S"), " cluster shell ",("footer_title", "Alt M"), " metric ", ("footer_title", "Alt D"), " dump metrics ", ("footer_title", "Ctrl Q"), " quit ", ]
@@ -0,0 +1,159 @@
+# Copyright (c) Ran Dugal 2023
+#
+# This file is part of picsh
+#
+# Licensed under the GNU Affero General Public License v3, which is available at
+# http://www.gnu.org/licenses/agpl-3.0.html
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU Affero GPL for more details.
+#
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import urwid
+
+from picsh.node import Node
+
+# line widgets kept around (with their wrapped layouts) for re-rendering
+LINE_WIDGET_CACHE_SIZE = 2000
+
+# a position is (node, line number); line number None is the node's separater
+Position = Tuple[Node, Optional[int]]
+
+
+class NodeOutputWalker(urwid.ListWalker):
+    # Presents the output of the visible nodes as one list of lines, a
+    # separater line per node followed by its output lines. Widgets are only
+    # made for the positions the ListBox asks for, i.e. the ones on screen, and
+    # are cached so urwid's per-widget layout cache survives between frames.
+
+    def __init__(self):
+        self._nodes: List[Node] = []
+        self._node_pos: Dict[Node, int] = {}
+        self._separaters: Dict[Node, Tuple[str, urwid.Widget]] = {}
+        # (node, line number) => (buffer generation, text, widget)
+        self._line_widgets: "OrderedDict[Tuple[Node, int], Tuple[int, str, urwid.Text]]" = (
+            OrderedDict()
+        )
+        self._focus: Optional[Position] = None
+        self._highlight: Optional[Position] = None
+
+    def set_nodes(self, nodes: List[Node], headers: Optional[Dict[Node, str]] = None):
+        # headers replace the default separater text of the given nodes
+        self._nodes = list(nodes)
+        self._node_pos = {node: pos for pos, node in enumerate(self._nodes)}
+        separaters = {}
+        for node in self._nodes:
+            header = (headers or {}).get(node) or f"[{str(node.idx)}] {node.ip_addr}==>"
+            separater = self._separaters.get(node)
+            if not separater or separater[0] != header:
+                separater = (header, urwid.AttrMap(urwid.Text(header), "output_separater"))
+            separaters[node] = separater
+        self._separaters = separaters
+        if self._focus and self._focus[0] not in self._node_pos:
+            self._focus = None
+        self._modified()
+
+    def refresh(self):
+        self._modified()
+
+    def set_highlight(self, position: Optional[Position]):
+        self._highlight = position
+        self._modified()
+
+    def get_focus(self):
+        position = self._valid_focus()
+        if position is None:
+            return None, None
+        return self._widget_at(position), position
+
+    def set_focus(self, position: Position):
+        self._focus = position
+        self._modified()
+
+    def get_next(self, position: Position):
+        node, lineno = position
+        buf = node.recv_buf
+        next_lineno = buf.first_lineno if lineno is None else lineno + 1
+        next_lineno = max(next_lineno, buf.first_lineno)
+        if next_lineno < buf.first_lineno + buf.line_count():
+            position = (node, next_lineno)
+        else:
+            pos = self._node_pos.get(node, len(self._nodes)) + 1
+            if pos >= len(self._nodes):
+                return None, None
+            position = (self._nodes[pos], None)
+        return self._widget_at(position), position
+
+    def get_prev(self, position: Position):
+        node, lineno = position
+        buf = node.recv_buf
+        if lineno is not None and lineno > buf.first_lineno:
+            prev_lineno = min(lineno - 1, buf.first_lineno + buf.line_count() - 1)
+            position = (node, prev_lineno)
+        elif lineno is not None:
+            position = (node, None)
+        else:
+            pos = self._node_pos.get(node, 0) - 1
+            if pos < 0:
+                return None, None
+            prev_node = self._nodes[pos]
+            prev_buf = prev_node.recv_buf
+            if prev_buf.line_count():
+                last = prev_buf.first_lineno + prev_buf.line_count() - 1
+                position = (prev_node, last)
+            else:
+                position = (prev_node, None)
+        return self._widget_at(position), position
+
+    def positions(self, reverse: bool = False):
+        # generated lazily; the ListBox only takes the first one for home/end
+        if not self._nodes:
+            return
+        if reverse:
+            node = self._nodes[-1]
+            buf = node.recv_buf
+            position = (node, buf.first_lineno + buf.line_count() - 1)
+            if not buf.line_count():
+                position = (node, None)
+        else:
+            position = (self._nodes[0], None)
+        step = self.get_prev if reverse else self.get_next
+        while position is not None:
+            yield position
+            position = step(position)[1]
+
+    def _valid_focus(self) -> Optional[Position]:
+        # the focused line may have been trimmed or its node cleared since
+        if not self._nodes:
+            return None
+        if self._focus is None:
+            return (self._nodes[0], None)
+        node, lineno = self._focus
+        if lineno is not None:
+            buf = node.recv_buf
+            if not buf.first_lineno <= lineno < buf.first_lineno + buf.line_count():
+                return (node, None)
+        return self._focus
+
+    def _widget_at(self, position: Position):
+        node, lineno = position
+        if lineno is None:
+            return self._separaters[node][1]
+        buf = node.recv_buf
+        text = buf.line(lineno - buf.first_lineno)
+        if position == self._highlight:
+            return urwid.AttrMap(urwid.Text(text), "search_match")
+        key = (node, lineno)
+        cached = self._line_widgets.get(key)
+        if cached and cached[0] == buf.generation and cached[1] == text:
+            self._line_widgets.move_to_end(key)
+            return cached[2]
+        widget = urwid.Text(text)
+        self._line_widgets[key] = (buf.generation, text, widget)
+        if len(self._line_widgets) > LINE_WIDGET_CACHE_SIZE:
+            self._line_widgets.popitem(last=False)
+        return widget
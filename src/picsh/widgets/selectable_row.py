@@ -14,19 +14,28 @@ import urwid
 
 
 class SelectableRow(urwid.WidgetWrap):
-    def __init__(self, contents, idx, on_select=None):
+    def __init__(self, contents, idx, on_select=None, widths=(40, 6)):
         self.contents = contents
         self.idx = idx
         self.on_select = on_select
+        self._cells = [urwid.Text(contents[0], align="left")] + [
+            urwid.Text(" " + text, align="center", wrap="clip") for text in contents[1:]
+        ]
         self._columns = urwid.Columns(
-            [
-                ("fixed", 40, urwid.Text(contents[0], align="left")),
-                ("fixed", 6, urwid.Text(" " + contents[1], align="center")),
-            ]
+            [("fixed", width, cell) for width, cell in zip(widths, self._cells)]
         )
         self._focusable_columns = urwid.AttrMap(self._columns, "", "reveal_focus")
         super(SelectableRow, self).__init__(self._focusable_columns)
 
+    def set_cell_text(self, col, text):
+        # patch one cell in place, only touching the widget if the text changed
+        if self.contents[col] == text:
+            return
+        contents = list(self.contents)
+        contents[col] = text
+        self.contents = tuple(contents)
+        self._cells[col].set_text(text if col == 0 else " " + text)
+
     def selectable(self):
         return True
 
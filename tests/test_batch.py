@@ -0,0 +1,55 @@
+import asyncio
+import io
+
+from picsh.batch import EXIT_TIMEOUT, EXIT_UNREACHABLE, _PrefixedPrinter, _exit_status, _run
+from picsh.node import CommandState, ConnectionState, Node
+
+
+class _SilentNode(Node):
+    # starts every command and never finishes it
+    async def run_cmd(self, cmd, connect_window=None):
+        self.cmd_state = CommandState.RUNNING
+        self.exit_status = None
+        self._cmd_done = asyncio.Event()
+
+
+def _node(idx, exit_status=None, node_cls=Node):
+    node = node_cls()
+    node.idx = idx
+    node.ip_addr = f"10.0.0.{idx}"
+    node.exit_status = exit_status
+    return node
+
+
+def test_printer_prefixes_lines_as_they_arrive():
+    out = io.StringIO()
+    printer = _PrefixedPrinter(out)
+    node = _node(1)
+    node.recv_buf.append("one\ntw")
+    printer.on_output(node)
+    assert out.getvalue() == "10.0.0.1: one\n"
+    node.recv_buf.append("o\nthr")
+    printer.on_output(node)
+    # still connecting: its output is the login banner
+    node.conn_state = ConnectionState.CONNECTING
+    node.recv_buf.append("ee")
+    printer.on_output(node)
+    assert out.getvalue() == "10.0.0.1: one\n10.0.0.1: two\n"
+    printer.flush([node])
+    assert out.getvalue().endswith("10.0.0.1: three\n")
+
+
+def test_exit_status():
+    assert _exit_status([_node(0, 0), _node(1, 0)]) == 0
+    assert _exit_status([_node(0, 0), _node(1, 3), _node(2, 1)]) == 3
+    assert _exit_status([_node(0, 3), _node(1, None)]) == EXIT_UNREACHABLE
+    assert _exit_status([_node(0, 300)]) == EXIT_UNREACHABLE
+
+
+def test_timeout_reports_only_the_selected_nodes(capsys):
+    nodes = [_node(idx, node_cls=_SilentNode) for idx in range(4)]
+    out = io.StringIO()
+    status = asyncio.run(_run(nodes, "@0-1 sleep 100", 4, 0.05, out, None))
+    assert status == EXIT_TIMEOUT
+    err = capsys.readouterr().err
+    assert "timed out waiting for 10.0.0.0 10.0.0.1\n" in err
@@ -0,0 +1,40 @@
+import asyncio
+from picsh.fanout_window import FanoutWindow
+
+
+def test_window_bounds_concurrency_in_arrival_order():
+    async def run():
+        window = FanoutWindow(2)
+        started = []
+        peak = 0
+
+        async def work(i):
+            nonlocal peak
+            async with window:
+                started.append(i)
+                peak = max(peak, window.in_flight)
+                await asyncio.sleep(0.01)
+
+        tasks = [asyncio.ensure_future(work(i)) for i in range(6)]
+        await asyncio.sleep(0)
+        assert window.stats() == {"in_flight": 2, "queued": 4, "completed": 0}
+        await asyncio.gather(*tasks)
+        assert started == list(range(6))
+        assert peak == 2
+        assert window.stats() == {"in_flight": 0, "queued": 0, "completed": 6}
+
+    asyncio.run(run())
+
+
+def test_resize_admits_waiters():
+    async def run():
+        window = FanoutWindow(1)
+        await window.acquire()
+        waiter = asyncio.ensure_future(window.acquire())
+        await asyncio.sleep(0)
+        assert window.queued == 1
+        window.resize(2)
+        await waiter
+        assert window.in_flight == 2
+
+    asyncio.run(run())
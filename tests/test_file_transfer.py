@@ -0,0 +1,189 @@
+import asyncio
+import gzip
+import os
+import threading
+from types import SimpleNamespace
+
+import asyncssh
+
+from picsh import file_transfer
+from picsh.fanout_window import FanoutWindow
+from picsh.file_transfer import TransferProgress, _GzipSink, _LocalSource, _local_rel_path
+from picsh.node import Node
+
+
+def test_local_source_walks_directory(tmp_path):
+    (tmp_path / "bundle" / "conf").mkdir(parents=True)
+    (tmp_path / "bundle" / "conf" / "a.cfg").write_bytes(b"abc")
+    (tmp_path / "bundle" / "run.sh").write_bytes(b"#!/bin/sh\n")
+    source = _LocalSource(str(tmp_path / "bundle"))
+    assert source.dirs == ["bundle", "bundle/conf"]
+    assert [rel for rel, _, _ in source.files] == ["bundle/run.sh", "bundle/conf/a.cfg"]
+    assert source.total_bytes == 13
+    assert bytes(source.files[1][2]) == b"abc"
+    source.close()
+
+
+def test_progress():
+    progress = TransferProgress("push", 200)
+    assert progress.fraction() == 0 and progress.rate() is None
+    progress.start()
+    progress.done_bytes = 50
+    assert progress.fraction() == 0.25
+    progress.finish()
+    assert progress.finished and progress.error is None
+
+
+def test_gzip_sink_resumes_from_last_member(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_transfer, "CHECKPOINT_BYTES", 4)
+    path = str(tmp_path / "node" / "app.log.gz")
+    sink = _GzipSink(path)
+    assert sink.resume_offset(100) == 0
+    sink.open(0)
+    sink.write(b"line1\n")
+    sink.write(b"li")
+    # interrupted: the open member is lost, the first one is kept
+    sink._fh.close()
+    sink = _GzipSink(path)
+    assert sink.resume_offset(100) == 6
+    sink.open(6)
+    sink.write(b"line2\n")
+    sink.close()
+    with gzip.open(path) as fh:
+        assert fh.read() == b"line1\nline2\n"
+    # the remote file was truncated (rotated), start over
+    assert _GzipSink(path).resume_offset(3) == 0
+
+
+def test_pulled_paths_stay_under_node_dir():
+    assert _local_rel_path("/var/log/app.log") == os.path.join("var", "log", "app.log")
+    assert _local_rel_path("../../etc/passwd") == os.path.join("__", "__", "etc", "passwd")
+
+
+class _FailingFile:
+    # fails the second write, like a node whose disk fills up mid-push
+    def __init__(self, writes):
+        self._writes = writes
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def write(self, data, offset):
+        self._writes.append(offset)
+        failing = len(self._writes) == 2
+        await asyncio.sleep(0)
+        if failing:
+            raise OSError("No space left on device")
+
+
+class _FakeSFTP:
+    def __init__(self):
+        self.writes = []
+
+    def open(self, path, mode):
+        return _FailingFile(self.writes)
+
+    async def chmod(self, path, mode):
+        pass
+
+
+class _SFTPNode(Node):
+    async def sftp_client(self, connect_window=None):
+        return self.sftp
+
+
+def test_push_reports_a_node_failing_mid_write(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_transfer, "CHUNK_BYTES", 4)
+    (tmp_path / "data.bin").write_bytes(b"x" * 64)
+    nodes = []
+    for idx in range(2):
+        node = _SFTPNode()
+        node.idx = idx
+        node.ip_addr = f"10.0.0.{idx}"
+        node.sftp = _FakeSFTP()
+        nodes.append(node)
+    results = asyncio.run(
+        file_transfer.push(
+            nodes, str(tmp_path / "data.bin"), "/tmp", FanoutWindow(2), lambda node: None
+        )
+    )
+    for node in nodes:
+        assert isinstance(results[node].error, OSError)
+        assert results[node].error.__traceback__ is None
+        assert "push failed: No space left on device" in node.recv_buf.text()
+
+
+class _RemoteFile:
+    def __init__(self, data):
+        self._data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def read(self, size, offset):
+        await asyncio.sleep(0)
+        return self._data[offset : offset + size]
+
+
+class _FakePullSFTP:
+    def __init__(self, data):
+        self.data = data
+
+    async def glob_sftpname(self, pattern):
+        attrs = SimpleNamespace(type=asyncssh.FILEXFER_TYPE_REGULAR, size=len(self.data))
+        return [SimpleNamespace(filename="/var/log/app.log", attrs=attrs)]
+
+    def open(self, path, mode):
+        return _RemoteFile(self.data)
+
+
+def test_cancelled_pull_keeps_a_resumable_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_transfer, "CHUNK_BYTES", 4)
+    monkeypatch.setattr(file_transfer, "CHECKPOINT_BYTES", 4)
+    remote = b"".join(b"%03d\n" % i for i in range(50))
+    node = _SFTPNode()
+    node.idx = 0
+    node.ip_addr = "10.0.0.1"
+    node.sftp = _FakePullSFTP(remote)
+    entered, release = threading.Event(), threading.Event()
+    write = _GzipSink.write
+
+    def slow_write(sink, data):
+        # the third chunk is still being written when the pull is cancelled
+        if sink._remote_offset == 8:
+            entered.set()
+            release.wait(5)
+        write(sink, data)
+
+    async def cancel_mid_write():
+        task = asyncio.ensure_future(
+            file_transfer.pull([node], "/var/log/*", str(tmp_path), FanoutWindow(1), lambda n: None)
+        )
+        while not entered.is_set():
+            await asyncio.sleep(0.001)
+        task.cancel()
+        asyncio.get_event_loop().call_later(0.05, release.set)
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    monkeypatch.setattr(_GzipSink, "write", slow_write)
+    asyncio.run(cancel_mid_write())
+    monkeypatch.setattr(_GzipSink, "write", write)
+    path = str(tmp_path / "0-10.0.0.1" / "var" / "log" / "app.log.gz")
+    # the write in flight finished before the sink was closed
+    with gzip.open(path) as fh:
+        assert fh.read() == remote[:12]
+    assert _GzipSink(path).resume_offset(len(remote)) == 12
+    asyncio.run(
+        file_transfer.pull([node], "/var/log/*", str(tmp_path), FanoutWindow(1), lambda n: None)
+    )
+    with gzip.open(path) as fh:
+        assert fh.read() == remote
@@ -0,0 +1,55 @@
+import asyncio
+import pytest
+
+from picsh.cluster_spec import ObjClusterSpec
+from picsh.exceptions.picsh_exception import PicshException
+from picsh.jump_hosts import parse_jump_host
+
+
+def test_parse_jump_host():
+    assert parse_jump_host("bastion") == (None, "bastion", 22)
+    assert parse_jump_host("ops@10.0.0.1:2222") == ("ops", "10.0.0.1", 2222)
+    with pytest.raises(PicshException):
+        parse_jump_host("ops@bastion:ssh")
+
+
+def test_nodes_share_jump_host():
+    spec = ObjClusterSpec(
+        {
+            "login_user": "ec2-user",
+            "jump_host": "bastion",
+            "jump_connections": 4,
+            "nodes": [
+                {"ip": "10.0.0.1"},
+                {"ip": "10.0.0.2"},
+                {"ip": "10.0.0.3", "jump_host": "none"},
+                {"ip": "10.0.0.4", "jump_host": "other:2200"},
+            ],
+        }
+    )
+    first, second, direct, other = spec.nodes
+    assert first.jump_host is second.jump_host
+    assert first.jump_host.login_user == "ec2-user"
+    assert direct.jump_host is None
+    assert str(other.jump_host) == "other:2200"
+
+
+def test_only_the_spec_closes_shared_jump_hosts():
+    spec = ObjClusterSpec(
+        {"jump_host": "bastion", "nodes": [{"ip": "10.0.0.1"}, {"ip": "10.0.0.2"}]}
+    )
+    closed = []
+
+    class _Conn:
+        def close(self):
+            closed.append(self)
+
+    loop = asyncio.new_event_loop()
+    conn = loop.create_future()
+    conn.set_result(_Conn())
+    spec.nodes[0].jump_host._conns[0] = conn
+    spec.nodes[0].disconnect()
+    assert not closed
+    spec.close()
+    assert len(closed) == 1
+    loop.close()
@@ -0,0 +1,50 @@
+import asyncio
+
+from picsh.node import Node, CommandState, CMD_DONE_MARKER
+
+
+def _running_node():
+    node = Node()
+    node._cmd_seq = 1
+    node.cmd_state = CommandState.RUNNING
+    return node
+
+
+def test_done_marker_is_stripped_across_reads():
+    node = _running_node()
+    marker_line = f"{CMD_DONE_MARKER}:1:2\n"
+    node.data_received("line one\nno newline" + marker_line[:10], None)
+    assert node.recv_buf.text() == "line one\nno newline"
+    assert node.cmd_state == CommandState.RUNNING
+    node.data_received(marker_line[10:], None)
+    assert node.recv_buf.text() == "line one\nno newline"
+    assert node.cmd_state == CommandState.FINISHED
+    assert node.exit_status == 2
+
+
+def test_stale_marker_does_not_finish_command():
+    node = _running_node()
+    node._cmd_seq = 2
+    node.data_received(f"{CMD_DONE_MARKER}:1:0\nout\n", None)
+    assert node.recv_buf.text() == "out\n"
+    assert node.cmd_state == CommandState.RUNNING
+
+
+class _FakeChannel:
+    def write(self, data):
+        pass
+
+
+def test_rerun_wakes_waiters_of_previous_command():
+    async def run():
+        node = Node()
+        node._is_connected = True
+        node._chan = _FakeChannel()
+        await node.run_cmd("sleep 100")
+        waiter = asyncio.ensure_future(node.wait_cmd_done())
+        await asyncio.sleep(0)
+        await node.run_cmd("uptime")
+        await asyncio.wait_for(waiter, 1)
+        assert node.cmd_state == CommandState.RUNNING
+
+    asyncio.run(run())
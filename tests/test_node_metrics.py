@@ -0,0 +1,58 @@
+import csv
+
+from picsh.node import CommandState, Node
+from picsh.node_metrics import METRIC_NAMES, dump_metrics, format_metric, percentile, summarize
+from picsh.node_table import NodeTable
+
+
+def test_percentile_nearest_rank():
+    assert percentile([7.0], 50) == 7.0
+    assert percentile([7.0], 95) == 7.0
+    values = [float(v) for v in range(1, 21)]
+    assert percentile(values, 50) == 10.0
+    assert percentile(values, 95) == 19.0
+    assert percentile(values, 100) == 20.0
+    assert percentile(values, 0) == 1.0
+
+
+def test_format_metric():
+    assert format_metric("connect", None) == "-"
+    assert format_metric("bytes", 1234) == "1234"
+    assert format_metric("rate", 512) == "512/s"
+    assert format_metric("rate", 3 * 1024 * 1024) == "3M/s"
+    assert format_metric("auth", 0.125) == "0.12s"
+
+
+def test_summarize_skips_nodes_without_a_value():
+    table = NodeTable(3)
+    nodes = [Node(table, row) for row in range(3)]
+    nodes[0].connect_time = 0.5
+    nodes[2].connect_time = 0.1
+    expected = {"p50": 0.1, "p95": 0.5, "max": 0.5}
+    assert summarize("connect", nodes) == expected
+    assert summarize("connect", nodes, table) == expected
+    assert summarize("auth", nodes) is None
+
+
+def test_dump_metrics_columns(tmp_path):
+    node = Node()
+    node.idx = 4
+    node.ip_addr = "10.0.0.4"
+    node.connect_time = 0.25
+    node.recv_buf.append("abc")
+    node.cmd_state = CommandState.FINISHED
+    node.cmd_duration = 2.0
+    node.exit_status = 1
+    path = tmp_path / "metrics.csv"
+    dump_metrics([node], str(path))
+    with open(path, newline="") as fh:
+        header, row = list(csv.reader(fh))
+    assert header == ["idx", "ip"] + METRIC_NAMES + ["exit_status"]
+    values = dict(zip(header, row))
+    assert values["idx"] == "4" and values["ip"] == "10.0.0.4"
+    assert values["bytes"] == "3"
+    assert values["connect"] == "0.25"
+    assert values["auth"] == ""
+    assert values["duration"] == "2.0"
+    assert values["rate"] == "1.5"
+    assert values["exit_status"] == "1"
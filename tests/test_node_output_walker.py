@@ -0,0 +1,76 @@
+from picsh.node import Node
+from picsh.output_buffer import OutputBuffer
+from picsh.widgets.node_output_walker import NodeOutputWalker
+
+
+def _node(idx, text, **buf_args):
+    node = Node(recv_buf=OutputBuffer(**buf_args))
+    node.idx = idx
+    node.ip_addr = f"10.0.0.{idx}"
+    node.recv_buf.append(text)
+    return node
+
+
+def _text(widget):
+    return widget.base_widget.text
+
+
+def test_positions_run_through_all_nodes():
+    nodes = [_node(0, "a\nb\n"), _node(1, ""), _node(2, "c")]
+    walker = NodeOutputWalker()
+    walker.set_nodes(nodes)
+    assert list(walker.positions()) == [
+        (nodes[0], None), (nodes[0], 0), (nodes[0], 1),
+        (nodes[1], None),
+        (nodes[2], None), (nodes[2], 0),
+    ]
+    assert list(walker.positions(reverse=True)) == list(reversed(list(walker.positions())))
+    assert _text(walker.get_next((nodes[0], 1))[0]) == "[1] 10.0.0.1==>"
+
+
+def test_trimmed_lines_move_positions_forward():
+    node = _node(0, "".join(f"line{i}\n" for i in range(10)), max_bytes=20)
+    walker = NodeOutputWalker()
+    walker.set_nodes([node])
+    first = node.recv_buf.first_lineno
+    assert first > 0
+    # a position on a trimmed line steps to the first line still held
+    widget, position = walker.get_next((node, 0))
+    assert position == (node, first)
+    assert _text(widget) == f"line{first}"
+    assert walker.get_prev((node, first))[1] == (node, None)
+    # a focused line that was trimmed falls back to the separater
+    walker.set_focus((node, first))
+    node.recv_buf.append("more\nlines\n")
+    assert walker.get_focus()[1] == (node, None)
+
+
+def test_spilled_lines_keep_their_positions():
+    node = _node(0, "".join(f"line{i}\n" for i in range(100)), max_bytes=50, max_spill_bytes=1024 * 1024)
+    walker = NodeOutputWalker()
+    walker.set_nodes([node])
+    assert node.recv_buf.first_lineno == 0
+    texts = [_text(walker.get_next(position)[0]) for position in list(walker.positions())[:-1]]
+    assert texts == [f"line{i}" for i in range(100)]
+
+
+def test_line_widgets_are_cached_per_generation():
+    node = _node(0, "same\n")
+    walker = NodeOutputWalker()
+    walker.set_nodes([node])
+    widget = walker.get_next((node, None))[0]
+    assert walker.get_next((node, None))[0] is widget
+    # same text at the same line number after a clear is a new line
+    node.recv_buf.replace("same\n")
+    assert walker.get_next((node, None))[0] is not widget
+
+
+def test_search_match_is_highlighted():
+    node = _node(0, "a\nmatch\n")
+    walker = NodeOutputWalker()
+    walker.set_nodes([node])
+    walker.set_highlight((node, 1))
+    highlighted = walker.get_next((node, 0))[0]
+    assert highlighted.get_attr_map() == {None: "search_match"}
+    assert _text(highlighted) == "match"
+    assert not hasattr(walker.get_next((node, None))[0], "get_attr_map")
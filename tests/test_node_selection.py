@@ -0,0 +1,51 @@
+import pytest
+
+from picsh.cluster_spec import ObjClusterSpec
+from picsh.node_selection import NodeSelector, SelectionError
+
+
+def _selector():
+    spec = ObjClusterSpec(
+        {
+            "groups": {"db": ["db-1", "10.0.1.1"]},
+            "nodes": [
+                {"ip": "10.0.0.1", "name": "web-1", "tags": ["gpu"]},
+                {"ip": "10.0.0.2", "name": "web-2"},
+                {"ip": "10.0.1.1"},
+                {"ip": "10.0.1.2", "name": "db-1"},
+                {"ip": "10.0.2.9", "tags": ["gpu"]},
+            ],
+        }
+    )
+    return NodeSelector(spec.nodes)
+
+
+def _idxs(selector, expr):
+    return [node.idx for node in selector.select(expr)]
+
+
+def test_terms():
+    selector = _selector()
+    assert _idxs(selector, "0,3") == [0, 3]
+    assert _idxs(selector, "1-3") == [1, 2, 3]
+    assert _idxs(selector, "*,!2") == [0, 1, 3, 4]
+    assert _idxs(selector, "!0-1") == [2, 3, 4]
+    assert _idxs(selector, "web-*") == [0, 1]
+    assert _idxs(selector, "re:^db|2$") == [1, 3]
+    assert _idxs(selector, "tag:gpu") == [0, 4]
+    assert _idxs(selector, "tag:db") == [2, 3]
+    assert _idxs(selector, "net:10.0.1.0/24") == [2, 3]
+    assert _idxs(selector, "10.0.0.0/23,!web-2") == [0, 2, 3]
+    assert _idxs(selector, "10.0.2.9") == [4]
+
+
+def test_saved_selection():
+    selector = _selector()
+    assert _idxs(selector, "$front=web-*,4") == [0, 1, 4]
+    assert _idxs(selector, "$front,!0") == [1, 4]
+
+
+@pytest.mark.parametrize("expr", ["9", "3-1", "nosuch", "re:(", "tag:nope", "net:10.0.0.0/99", "$none", "web-*,!web-*"])
+def test_errors(expr):
+    with pytest.raises(SelectionError):
+        _selector().select(expr)
@@ -0,0 +1,23 @@
+from picsh.node import Node, CommandState, ConnectionState
+from picsh.node_table import NodeTable
+
+
+def test_node_state_lives_in_its_table_row():
+    table = NodeTable(3)
+    nodes = [Node(table, idx) for idx in range(3)]
+    assert nodes[1].exit_status is None
+    assert nodes[1].connect_time is None
+    assert nodes[1].conn_state == ConnectionState.DISCONNECTED
+    nodes[1].cmd_state = CommandState.RUNNING
+    nodes[1].connect_time = 0.25
+    nodes[2].cmd_state = CommandState.FINISHED
+    nodes[2].exit_status = 3
+    nodes[2].hide = True
+    assert nodes[1].cmd_state == CommandState.RUNNING
+    assert nodes[1].connect_time == 0.25
+    assert nodes[0].cmd_state == CommandState.IDLE
+    assert nodes[2].hide and not nodes[0].hide
+    assert table.count("cmd_state", CommandState.RUNNING) == 1
+    nodes[2].exit_status = None
+    assert nodes[2].exit_status is None
+
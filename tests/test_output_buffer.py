@@ -0,0 +1,117 @@
+from picsh import output_buffer
+from picsh.output_buffer import OutputBuffer, BufferBudget
+
+
+def test_append_and_lines():
+    buf = OutputBuffer()
+    buf.append("hello\nwor")
+    buf.append("ld\npartial")
+    assert buf.text() == "hello\nworld\npartial"
+    assert buf.line_count() == 3
+    assert buf.line(1) == "world"
+    assert buf.line(2) == "partial"
+    assert len(buf) == buf.bytes_received == len("hello\nworld\npartial")
+
+
+def test_node_cap_trims_oldest_lines():
+    buf = OutputBuffer(max_bytes=10)
+    for i in range(10):
+        buf.append(f"line{i}\n")
+    assert len(buf) <= 10
+    assert buf.text() == "line9\n"
+    assert buf.first_lineno == 9
+    assert buf.bytes_received == 60
+    assert buf.bytes_dropped == 54
+
+
+def test_unterminated_line_is_capped():
+    buf = OutputBuffer(max_bytes=4)
+    buf.append("abcdefgh")
+    assert buf.text() == "efgh"
+
+
+def test_shared_budget():
+    budget = BufferBudget(max_bytes=20)
+    a = OutputBuffer(budget=budget)
+    b = OutputBuffer(budget=budget)
+    a.append("aaaa\n")
+    b.append("bbbb\nbbbb\nbbbb\nbbbb\n")
+    assert budget.used_bytes <= 20
+    assert a.text() == "aaaa\n"
+    assert b.text() == "bbbb\nbbbb\nbbbb\n"
+    a.clear()
+    b.clear()
+    assert budget.used_bytes == 0
+
+
+def test_digest_tracks_received_output():
+    a = OutputBuffer()
+    b = OutputBuffer()
+    a.append("Linux\n")
+    b.append("Lin")
+    assert a.digest() != b.digest()
+    b.append("ux\n")
+    assert a.digest() == b.digest()
+    b.clear()
+    assert b.digest() == OutputBuffer().digest()
+
+
+def test_spilled_lines_are_read_back():
+    buf = OutputBuffer(max_bytes=100, max_spill_bytes=1024 * 1024)
+    for i in range(1000):
+        buf.append(f"line{i}\n")
+    buf.append("tail")
+    assert len(buf) <= 100
+    assert buf.bytes_dropped == 0
+    assert buf.first_lineno == 0
+    assert buf.line_count() == 1001
+    assert buf.line(0) == "line0"
+    assert buf.line(999) == "line999"
+    assert buf.line(1000) == "tail"
+    assert buf.complete_lines(997) == ["line997", "line998", "line999"]
+    # a range across the spilled and in-memory lines and the tail
+    assert buf.lines(0, 2) == ["line0", "line1"]
+    assert buf.lines(990, 1001) == [f"line{i}" for i in range(990, 1000)] + ["tail"]
+    assert buf.lines(998, 1000) == ["line998", "line999"]
+
+
+def test_spill_cap_drops_oldest_segment():
+    buf = OutputBuffer(max_bytes=1024, max_spill_bytes=2 * 1024 * 1024)
+    line = "x" * 1023
+    for i in range(3 * 1024):
+        buf.append(f"{line}\n")
+    assert buf.first_lineno > 0
+    assert buf.bytes_dropped > 0
+    assert buf.line_count() < 3 * 1024
+    assert buf.line(0) == line
+
+
+def test_spill_budget_caps_all_buffers():
+    budget = BufferBudget(max_bytes=1024 * 1024, max_spill_bytes=64 * 1024)
+    bufs = [OutputBuffer(max_bytes=1024, budget=budget, max_spill_bytes=1024 * 1024) for _ in range(2)]
+    line = "x" * 99
+    for i in range(2000):
+        for buf in bufs:
+            buf.append(f"{line}\n")
+    assert budget.spilled_bytes <= 64 * 1024 + 1024
+    for buf in bufs:
+        assert buf.first_lineno > 0
+        assert buf.line(0) == line
+
+
+def test_failed_spill_trims_instead(monkeypatch):
+    buf = OutputBuffer(max_bytes=100, max_spill_bytes=1024 * 1024)
+    for i in range(20):
+        buf.append(f"line{i}\n")
+    assert buf.first_lineno == 0
+
+    def full_disk(*args):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(output_buffer.os, "pwrite", full_disk)
+    for i in range(20, 40):
+        buf.append(f"line{i}\n")
+    assert len(buf) <= 100
+    assert buf.first_lineno > 0
+    assert buf.line_count() == 40 - buf.first_lineno
+    assert buf.line(buf.line_count() - 1) == "line39"
@@ -0,0 +1,33 @@
+from picsh.node import Node
+from picsh.output_grouper import OutputGrouper, format_node_ranges
+
+
+def _nodes(outputs):
+    nodes = []
+    for idx, output in enumerate(outputs):
+        node = Node()
+        node.idx = idx
+        node.ip_addr = f"10.0.0.{idx}"
+        node.recv_buf.append(output)
+        nodes.append(node)
+    return nodes
+
+
+def test_format_node_ranges():
+    assert format_node_ranges([8, 0, 1, 2, 5, 7]) == "0-2,5,7-8"
+    assert format_node_ranges([3]) == "3"
+    assert format_node_ranges([]) == ""
+
+
+def test_grouping_is_incremental():
+    nodes = _nodes(["5.10\n", "5.10\n", "4.18\n", "5.10\n"])
+    grouper = OutputGrouper()
+    grouper.reset(nodes)
+    groups = grouper.groups()
+    assert [header for _, header in groups] == ["[0-1,3] 3 nodes==>", "[2] 10.0.0.2==>"]
+    assert groups[0][0] is nodes[0]
+
+    assert not grouper.update([nodes[1]])
+    nodes[2].recv_buf.replace("5.10\n")
+    assert grouper.update([nodes[2]])
+    assert [header for _, header in grouper.groups()] == ["[0-3] 4 nodes==>"]
@@ -0,0 +1,67 @@
+import asyncio
+
+from picsh.node import Node
+from picsh import output_search
+from picsh.output_search import OutputSearch
+
+
+def _node(idx, text):
+    node = Node()
+    node.idx = idx
+    node.recv_buf.append(text)
+    return node
+
+
+def test_search_finds_lines_on_all_nodes():
+    nodes = [_node(0, "ok\nOut of memory\n"), _node(1, "ok\n"), _node(2, "Segfault\nOut of")]
+    search = OutputSearch()
+    matches = asyncio.run(search.search("Out of", nodes))
+    assert matches == [(nodes[0], 1), (nodes[2], 1)]
+    matches = asyncio.run(search.search("re:^(Seg|ok)", nodes))
+    assert matches == [(nodes[0], 0), (nodes[1], 0), (nodes[2], 0)]
+
+
+def test_repeat_search_only_scans_new_lines():
+    node = _node(0, "a1\nb\n")
+    search = OutputSearch()
+    assert asyncio.run(search.search("a", [node])) == [(node, 0)]
+    node.recv_buf.append("a2\n")
+    assert asyncio.run(search.search("a", [node])) == [(node, 0), (node, 2)]
+    # a stale index after a clear must not be reused
+    node.recv_buf.replace("c\na3\n")
+    assert asyncio.run(search.search("a", [node])) == [(node, 1)]
+
+
+def test_search_yields_across_small_buffers(monkeypatch):
+    monkeypatch.setattr(output_search, "SCAN_CHUNK_LINES", 10)
+    nodes = [_node(idx, "a\nb\na\nb\n") for idx in range(20)]
+    ticks = []
+
+    async def run():
+        async def tick():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0)
+
+        ticker = asyncio.ensure_future(tick())
+        matches = await OutputSearch().search("a", nodes)
+        ticker.cancel()
+        return matches
+
+    assert len(asyncio.run(run())) == 40
+    # 80 lines, no buffer over 4 of them: still a yield every 10 lines
+    assert len(ticks) >= 7
+
+
+def test_buffer_cleared_during_scan_drops_its_matches(monkeypatch):
+    monkeypatch.setattr(output_search, "SCAN_CHUNK_LINES", 2)
+    node = _node(0, "a\na\na\na\n")
+
+    async def run():
+        async def clear():
+            node.recv_buf.replace("b\n")
+
+        asyncio.get_running_loop().create_task(clear())
+        return await OutputSearch().search("a", [node])
+
+    assert asyncio.run(run()) == []
@@ -0,0 +1,55 @@
+import asyncio
+from picsh.fanout_window import FanoutWindow
+from picsh.node import ConnectionState
+from picsh.reconnect import Reconnector, backoff_delay
+
+
+class _FlakyNode:
+    def __init__(self, failures):
+        self.failures = failures
+        self.attempts = 0
+        self.messages = []
+        self.conn_state = ConnectionState.DISCONNECTED
+
+    async def ensure_connected(self, connect_window=None):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionError("refused")
+        self.conn_state = ConnectionState.CONNECTED
+
+    def show_message(self, text):
+        self.messages.append(text)
+
+
+def test_backoff_delay_grows_with_jitter_up_to_max():
+    for attempt in range(10):
+        delay = backoff_delay(attempt, 1.0, 30.0)
+        assert min(30.0, 2**attempt) / 2 <= delay <= min(30.0, 2**attempt)
+
+
+def test_reconnect_retries_until_connected():
+    async def run():
+        reconnector = Reconnector(FanoutWindow(1), base_delay=0.001, max_delay=0.01)
+        node = _FlakyNode(failures=3)
+        reconnector.schedule(node)
+        reconnector.schedule(node)
+        assert reconnector.pending == 1
+        while reconnector.pending:
+            await asyncio.sleep(0.01)
+        assert node.attempts == 4 and len(node.messages) == 3
+        assert node.conn_state == ConnectionState.CONNECTED
+
+    asyncio.run(run())
+
+
+def test_reconnect_all_skips_connected_nodes():
+    async def run():
+        reconnector = Reconnector(FanoutWindow(4), base_delay=10)
+        nodes = [_FlakyNode(0), _FlakyNode(0)]
+        nodes[0].conn_state = ConnectionState.CONNECTED
+        reconnector.schedule(nodes[1])
+        assert reconnector.reconnect_all(nodes) == 1
+        await asyncio.sleep(0.01)
+        assert nodes[1].attempts == 1 and reconnector.pending == 0
+
+    asyncio.run(run())
@@ -0,0 +1,63 @@
+import pytest
+
+from picsh.cluster_spec import ObjClusterSpec
+from picsh.exceptions.picsh_exception import PicshException
+
+
+def _spec(ips, **cluster):
+    return ObjClusterSpec(dict(cluster, nodes=[{"ip": ip} for ip in ips]))
+
+
+def _relays(spec):
+    return {n.ip_addr: n.relay.ip_addr if n.relay else None for n in spec.nodes}
+
+
+def test_auto_relays_per_subnet():
+    ips = ["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.1.1", "10.0.1.2", "host-a"]
+    spec = _spec(ips, relays="auto", relay_max_leaves=1)
+    assert _relays(spec) == {
+        "10.0.0.1": None,
+        "10.0.0.2": "10.0.0.1",
+        "10.0.0.3": None,
+        "10.0.1.1": None,
+        "10.0.1.2": "10.0.1.1",
+        "host-a": None,
+    }
+
+
+def test_listed_relays_round_robin_and_overrides():
+    spec = ObjClusterSpec(
+        {
+            "relays": ["10.0.0.1", "10.0.0.2"],
+            "nodes": [
+                {"ip": "10.0.0.1"},
+                {"ip": "10.0.0.2"},
+                {"ip": "10.0.0.3"},
+                {"ip": "10.0.0.4"},
+                {"ip": "10.0.0.5", "relay": "none"},
+                {"ip": "10.9.0.1", "relay": "10.0.0.2"},
+            ],
+        }
+    )
+    assert _relays(spec) == {
+        "10.0.0.1": None,
+        "10.0.0.2": None,
+        "10.0.0.3": "10.0.0.1",
+        "10.0.0.4": "10.0.0.2",
+        "10.0.0.5": None,
+        "10.9.0.1": "10.0.0.2",
+    }
+
+
+def test_bad_relays():
+    with pytest.raises(PicshException):
+        _spec(["10.0.0.1"], relays=["10.0.0.9"])
+    with pytest.raises(PicshException):
+        ObjClusterSpec(
+            {
+                "nodes": [
+                    {"ip": "10.0.0.1", "relay": "10.0.0.2"},
+                    {"ip": "10.0.0.2", "relay": "10.0.0.1"},
+                ]
+            }
+        )
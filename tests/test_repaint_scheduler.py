@@ -0,0 +1,83 @@
+from picsh.controllers.base_controller import BaseController
+from picsh.repaint_scheduler import RepaintScheduler
+
+
+class _FakeTimer:
+    def __init__(self, when, callback):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class _FakeLoop:
+    # a clock that only moves when told to, and the timers due on it
+    def __init__(self):
+        self.now = 100.0
+        self.timers = []
+
+    def time(self):
+        return self.now
+
+    def call_later(self, delay, callback):
+        timer = _FakeTimer(self.now + delay, callback)
+        self.timers.append(timer)
+        return timer
+
+    def advance(self, seconds):
+        self.now += seconds
+        due = [t for t in self.timers if t.when <= self.now and not t.cancelled]
+        self.timers = [t for t in self.timers if t not in due and not t.cancelled]
+        for timer in due:
+            timer.callback()
+
+
+class _Recorder(BaseController):
+    def __init__(self):
+        super().__init__()
+        self.repaints = []
+
+    def repaint(self, dirty_nodes=None):
+        self.repaints.append(dirty_nodes)
+
+
+def test_bursts_collapse_into_frames_at_max_fps():
+    loop = _FakeLoop()
+    draws = []
+    scheduler = RepaintScheduler(loop, lambda: draws.append(loop.now), max_fps=10)
+    calls = []
+    repaint = lambda: calls.append(loop.now)
+    for _ in range(50):
+        scheduler.request(repaint)
+    loop.advance(0)
+    assert calls == [100.0] and draws == [100.0]
+    # the next burst waits out the rest of the frame interval
+    for _ in range(50):
+        scheduler.request(repaint)
+    loop.advance(0.05)
+    assert len(calls) == 1
+    loop.advance(0.05)
+    assert len(calls) == 2 and len(draws) == 2
+    assert scheduler.stats() == {"notifications": 100, "frames": 2}
+
+
+def test_dirty_nodes_are_merged_between_frames():
+    loop = _FakeLoop()
+    controller = _Recorder()
+    controller.set_repaint_scheduler(RepaintScheduler(loop, max_fps=10))
+    # the first frame repaints everything
+    controller.repaint_notifer("a")
+    loop.advance(0)
+    assert controller.repaints == [None]
+    controller.repaint_notifer("a")
+    controller.repaint_notifer("b")
+    controller.repaint_notifer("a")
+    loop.advance(0.1)
+    assert controller.repaints[1:] == [{"a", "b"}]
+    # a notification without a node makes the next frame a full repaint
+    controller.repaint_notifer("c")
+    controller.repaint_notifer()
+    loop.advance(0.1)
+    assert controller.repaints[2:] == [None]
@@ -0,0 +1,44 @@
+import asyncio
+import os
+
+from picsh.node import Node
+from picsh.session_recorder import SessionRecorder
+
+
+def test_output_is_written_per_node_and_rotated(tmp_path):
+    node = Node()
+    node.ip_addr = "10.0.0.1"
+    node.idx = 3
+
+    async def record():
+        recorder = SessionRecorder(str(tmp_path), max_file_bytes=10, keep_files=3)
+        for chunk in ("aaaaaaaaaaaa\n", "bbbbbbbbbbbb\n", "cccccccccccc\n", "dd"):
+            recorder.record(node, chunk)
+            recorder.flush()
+        recorder.close()
+
+    asyncio.run(record())
+    path = os.path.join(str(tmp_path), "node3-10.0.0.1.log")
+    with open(path) as fh:
+        assert fh.read() == "dd"
+    with open(path + ".1") as fh:
+        assert fh.read() == "cccccccccccc\n"
+    with open(path + ".2") as fh:
+        assert fh.read() == "bbbbbbbbbbbb\n"
+    assert not os.path.exists(path + ".3")
+
+
+def test_keep_files_counts_the_live_file(tmp_path):
+    node = Node()
+    node.ip_addr = "10.0.0.1"
+    node.idx = 0
+
+    async def record():
+        recorder = SessionRecorder(str(tmp_path), max_file_bytes=4, keep_files=2)
+        for chunk in ("aaaaa\n", "bbbbb\n", "ccccc\n", "dd"):
+            recorder.record(node, chunk)
+            recorder.flush()
+        recorder.close()
+
+    asyncio.run(record())
+    assert sorted(os.listdir(str(tmp_path))) == ["node0-10.0.0.1.log", "node0-10.0.0.1.log.1"]
@@ -0,0 +1,82 @@
+import asyncio
+
+from picsh.node import Node
+from picsh.views.single_shell_view import MAX_OPEN_TERMINALS, SingleShellView
+
+
+class _FakeChannel:
+    def __init__(self):
+        self.written = b""
+        self.closed = False
+
+    def write(self, data):
+        self.written += data
+
+    def change_terminal_size(self, width, height):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class _FakeConnection:
+    def __init__(self):
+        self.sessions = []
+
+    async def create_session(self, session_factory, **kwargs):
+        chan = _FakeChannel()
+        self.sessions.append((chan, session_factory(), kwargs))
+        return chan, None
+
+
+def _connected_node(idx):
+    node = Node()
+    node.idx = idx
+    node.ip_addr = f"10.0.0.{idx}"
+    node._is_connected = True
+    node._conn = _FakeConnection()
+    return node
+
+
+async def _open(view, node):
+    view.switch_to_terminal(node, None, lambda: None)
+    view.outer_widget().touch_term(80, 24)
+    await asyncio.sleep(0.01)
+
+
+def test_keys_go_to_the_channel_and_output_to_the_screen():
+    async def run():
+        view = SingleShellView(lambda update: None)
+        node = _connected_node(0)
+        await _open(view, node)
+        term = view.outer_widget()
+        chan, session, kwargs = node._conn.sessions[0]
+        assert kwargs["term_type"] == "linux"
+        assert kwargs["term_size"] == (80, 24)
+        for key in ("l", "s", "enter"):
+            term.keypress((80, 24), key)
+        await asyncio.sleep(0.01)
+        assert chan.written == b"ls\r"
+        session.data_received(b"total 0\r\n", None)
+        assert b"total 0" in term.render((80, 24)).text[0]
+        view.close_terminals()
+        assert chan.closed
+
+    asyncio.run(run())
+
+
+def test_least_recently_used_terminal_is_closed():
+    async def run():
+        view = SingleShellView(lambda update: None)
+        nodes = [_connected_node(idx) for idx in range(MAX_OPEN_TERMINALS + 1)]
+        for node in nodes[:MAX_OPEN_TERMINALS]:
+            await _open(view, node)
+        # revisiting node 0 makes node 1 the least recently used
+        await _open(view, nodes[0])
+        await _open(view, nodes[MAX_OPEN_TERMINALS])
+        chans = [node._conn.sessions[0][0] for node in nodes]
+        assert [chan.closed for chan in chans] == [False, True] + [False] * (MAX_OPEN_TERMINALS - 1)
+        assert len(nodes[0]._conn.sessions) == 1
+        view.close_terminals()
+
+    asyncio.run(run())
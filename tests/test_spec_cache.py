@@ -0,0 +1,40 @@
+import os
+import pickle
+
+from picsh import spec_cache
+from picsh.spec_cache import load_spec_yaml
+
+
+def test_cache_is_keyed_by_mtime(tmp_path, monkeypatch):
+    spec = tmp_path / "c.yaml"
+    spec.write_text("cluster_name: one\nnodes:\n  - ip: 10.0.0.1\n")
+    cache_dir = str(tmp_path / "cache")
+    assert load_spec_yaml(str(spec), cache_dir)["cluster_name"] == "one"
+    assert len(os.listdir(cache_dir)) == 1
+
+    def no_parse(*args, **kwargs):
+        raise AssertionError("parsed again")
+
+    monkeypatch.setattr(spec_cache.yaml, "load", no_parse)
+    assert load_spec_yaml(str(spec), cache_dir)["nodes"] == [{"ip": "10.0.0.1"}]
+    monkeypatch.undo()
+
+    spec.write_text("cluster_name: two\nnodes: []\n")
+    os.utime(spec, ns=(0, os.stat(spec).st_mtime_ns + 10**9))
+    assert load_spec_yaml(str(spec), cache_dir)["cluster_name"] == "two"
+
+
+def test_foreign_cache_file_is_ignored(tmp_path):
+    spec = tmp_path / "c.yaml"
+    spec.write_text("cluster_name: one\nnodes: []\n")
+    cache_dir = str(tmp_path / "cache")
+    cache_path = spec_cache._cache_path(str(spec), cache_dir)
+    os.makedirs(cache_dir)
+    # a pickled object of the wrong shape
+    with open(cache_path, "wb") as fh:
+        pickle.dump(42, fh)
+    assert load_spec_yaml(str(spec), cache_dir)["cluster_name"] == "one"
+    # and the cache was rewritten
+    assert load_spec_yaml(str(spec), cache_dir)["cluster_name"] == "one"
+    with open(cache_path, "rb") as fh:
+        assert pickle.load(fh)[1]["cluster_name"] == "one"